@@ -0,0 +1,756 @@
+"""
+Benchmarks for the content index behind the Kakao skill server.
+
+Generates a synthetic HTML_Conversion-style corpus (크롤링_QnA /
+크롤링_selftest_MD / 크롤링_Products) and times the index against it.
+
+Usage:
+    python benchmark.py ngram [--sizes 1000 5000 20000 50000]
+    python benchmark.py memory [--sizes 1000 10000 50000]
+    python benchmark.py fuzzy [--sizes 1000 10000 50000]
+    python benchmark.py bm25 [--sizes 1000 10000 50000]
+    python benchmark.py jamo [--sizes 1000 10000 50000]
+    python benchmark.py extract [--docs 500]
+    python benchmark.py build [--docs 20000] [--workers 1 2 4]
+    python benchmark.py mapped [--docs 20000]
+    python benchmark.py json [--repeat 2000]
+    python benchmark.py decode [--repeat 20000]
+    python benchmark.py intents [--utterances 200000]
+    python benchmark.py static [--repeat 3000]
+    python benchmark.py reindex [--docs 300] [--edits 5]
+"""
+import argparse
+import asyncio
+import contextlib
+import difflib
+import html
+import io
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+import tracemalloc
+import urllib.parse
+
+from doc_store import CATEGORY_FOLDERS, DocRecord, scan_posts
+from html_extract import extract_page
+from index_build import build_index
+from intent_table import load_intents
+from index_mmap import read_mapped_index, write_mapped_index
+from index_snapshot import read_snapshot, write_snapshot
+from json_response import dumps, orjson
+from kakao_request import KakaoRequest
+from hangul import chosung
+from search_index import BM25Index, NgramIndex, SearchIndex, build_part
+
+FOLDERS = ["크롤링_QnA", "크롤링_selftest_MD", "크롤링_Products"]
+
+WORDS = [
+    "리모컨", "화면", "설정", "전원", "소리", "안나와요", "구글", "TV", "넷플릭스",
+    "와이파이", "연결", "블루투스", "업데이트", "초기화", "AS", "접수", "배송",
+    "스탠드", "벽걸이", "케이블", "HDMI", "유튜브", "앱", "설치", "에러", "깜빡임",
+    "줄", "생김", "밝기", "자막", "외부입력", "셋톱박스", "음성인식", "절전",
+]
+
+# Broad queries match a fixed share of the corpus, so their hit count (and
+# any index's cost) grows with it; selective queries are drawn from single
+# titles and show how candidate generation scales on its own.
+BROAD_QUERIES = ["리모컨", "화면", "깜빡임", "와이파이 연결", "hdmi", "음성인식", "tv", "블루투스 리모컨"]
+
+
+def synthetic_title(rnd: random.Random, doc_no: int) -> str:
+    words = [rnd.choice(WORDS) for _ in range(rnd.randint(2, 5))]
+    return f"{' '.join(words)} {doc_no}"
+
+
+def synthetic_vocabulary(size: int = 5000, seed: int = 5):
+    # Two to four random syllables per word, on top of the fixed WORDS
+    rnd = random.Random(seed)
+    syllables = [chr(0xAC00 + i * 28) for i in range(0, 399, 7)]
+    return WORDS + ["".join(rnd.choice(syllables) for _ in range(rnd.randint(2, 4))) for _ in range(size)]
+
+
+def synthetic_body(rnd: random.Random, vocabulary, words: int = 300) -> str:
+    # Zipf-like: low vocabulary ranks are much more frequent
+    picks = (vocabulary[min(int(rnd.paretovariate(1.0)) - 1, len(vocabulary) - 1)] for _ in range(words))
+    return " ".join(picks)
+
+
+def synthetic_titles(n: int, seed: int = 7):
+    rnd = random.Random(seed)
+    return [synthetic_title(rnd, i) for i in range(n)]
+
+
+def make_corpus(base_dir: str, n: int, body_words: int = 300, seed: int = 7):
+    """
+    Writes n synthetic posts, spread across the three crawl folders.
+    """
+    rnd = random.Random(seed)
+    for i in range(n):
+        title = synthetic_title(rnd, i)
+        body = " ".join(rnd.choice(WORDS) for _ in range(body_words))
+        write_post(base_dir, FOLDERS[i % len(FOLDERS)], title, body, f"image_{i}.png" if i % 2 else None)
+
+
+def write_post(base_dir: str, folder: str, title: str, body: str, image_src=None):
+    post_dir = os.path.join(base_dir, folder, title)
+    os.makedirs(post_dir, exist_ok=True)
+    image = f'<img src="{image_src}">' if image_src else ""
+    with open(os.path.join(post_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write(
+            f"<html><head><title>{title}</title><style>p {{ margin: 0; }}</style></head>"
+            f'<body><div class="meta-info"><a href="#">Original Post</a></div>'
+            f"<h1>{title}</h1>{image}<p>{body}.</p>"
+            f"<table><tr><td>{body[:200]}</td></tr></table></body></html>"
+        )
+
+
+def timed(fn, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def selective_queries(titles, count: int = 20, seed: int = 11):
+    rnd = random.Random(seed)
+    # Last word plus doc number, e.g. "깜빡임 4821"
+    return [" ".join(rnd.choice(titles).split()[-2:]) for _ in range(count)]
+
+
+def bench_ngram(sizes):
+    print(f"{'docs':>8} {'queries':>10} {'scan us':>10} {'ngram us':>10} {'candidates':>11} {'hits':>8}")
+    for n in sizes:
+        titles = [t.lower() for t in synthetic_titles(n)]
+        grams = NgramIndex(titles)
+        for label, queries in (("broad", BROAD_QUERIES), ("selective", selective_queries(titles))):
+            scan_total = ngram_total = 0.0
+            candidates = hits = 0
+            for query in queries:
+                scan_time, expected = timed(lambda: {i for i, t in enumerate(titles) if query in t}, 5)
+                ngram_time, found = timed(lambda: grams.search(query), 5)
+                assert found == expected, query
+                scan_total += scan_time
+                ngram_total += ngram_time
+                candidates += len(grams.candidates(query) or ())
+                hits += len(found)
+            k = len(queries)
+            print(f"{n:>8} {label:>10} {scan_total / k * 1e6:>10.1f} {ngram_total / k * 1e6:>10.1f} "
+                  f"{candidates // k:>11} {hits // k:>8}")
+
+
+def typo_queries(titles, count: int = 40, seed: int = 2):
+    # First two words of a title with one syllable replaced
+    rnd = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        query = " ".join(rnd.choice(titles).split()[:2])
+        pos = rnd.randrange(len(query))
+        queries.append(query[:pos] + rnd.choice("가나다라마바사") + query[pos + 1:])
+    return queries + ["리모콘", "화면 깜박임", "와이파이연결", "블루투스 리모콘 설정"]
+
+
+def bench_fuzzy(sizes):
+    print(f"{'docs':>8} {'difflib ms':>11} {'fuzzy ms':>9} {'top-5 overlap':>14}")
+    for n in sizes:
+        titles = [t.lower() for t in synthetic_titles(n)]
+        index = SearchIndex(titles)
+        queries = typo_queries(titles)
+        difflib_total = fuzzy_total = 0.0
+        shared = expected_total = 0
+        for query in queries:
+            difflib_time, expected = timed(lambda: difflib.get_close_matches(query, titles, n=5, cutoff=0.4), 1)
+            fuzzy_time, found = timed(lambda: index.fuzzy_match(query), 3)
+            difflib_total += difflib_time
+            fuzzy_total += fuzzy_time
+            shared += len(set(expected) & {titles[doc_id] for doc_id in found})
+            expected_total += len(expected)
+        k = len(queries)
+        print(f"{n:>8} {difflib_total / k * 1e3:>11.2f} {fuzzy_total / k * 1e3:>9.2f} "
+              f"{shared / max(expected_total, 1):>14.0%}")
+
+
+def jamo_queries(titles, count: int = 40, seed: int = 3):
+    """
+    (query, word it stands for) pairs: initial consonants of a title word,
+    or the word with its vowel changed in one syllable ("리모컨" -> "리모콘").
+    """
+    rnd = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        word = rnd.choice([w for w in rnd.choice(titles).split() if len(w) > 1 and "가" <= w[0] <= "힣"] or ["리모컨"])
+        if rnd.random() < 0.5:
+            queries.append((chosung(word), word))
+            continue
+        pos = rnd.randrange(len(word))
+        lead, rest = divmod(ord(word[pos]) - 0xAC00, 588)
+        vowel, tail = divmod(rest, 28)
+        typo = chr(0xAC00 + lead * 588 + (vowel + 4) % 21 * 28 + tail)
+        queries.append((word[:pos] + typo + word[pos + 1:], word))
+    return queries
+
+
+def bench_jamo(sizes):
+    # "found": a returned title contains the intended word. Before, these
+    # queries fell through to the title-level fuzzy stage.
+    print(f"{'docs':>8} {'fuzzy ms':>9} {'found':>6} {'jamo ms':>8} {'found':>6}")
+    for n in sizes:
+        titles = [t.lower() for t in synthetic_titles(n)]
+        index = SearchIndex(titles)
+        queries = jamo_queries(titles)
+        fuzzy_total = jamo_total = 0.0
+        fuzzy_found = jamo_found = 0
+        for query, word in queries:
+            fuzzy_time, found = timed(lambda: index.fuzzy_match(query), 3)
+            fuzzy_total += fuzzy_time
+            fuzzy_found += any(word in titles[doc_id] for doc_id in found)
+            jamo_time, found = timed(lambda: index.chosung_match(query) or index.respelled_match(query), 3)
+            jamo_total += jamo_time
+            jamo_found += any(word in titles[doc_id] for doc_id in found)
+        k = len(queries)
+        print(f"{n:>8} {fuzzy_total / k * 1e3:>9.2f} {fuzzy_found / k:>6.0%} "
+              f"{jamo_total / k * 1e3:>8.2f} {jamo_found / k:>6.0%}")
+
+
+def bench_bm25(sizes):
+    vocabulary = synthetic_vocabulary()
+    rnd = random.Random(9)
+    queries = [" ".join(rnd.choice(vocabulary[:200]) for _ in range(rnd.randint(1, 3))) for _ in range(30)]
+    queries += ["리모컨 배터리 교체", "화면 깜빡임 증상", "와이파이 연결 안됨"]
+    print(f"{'docs':>8} {'build s':>8} {'postings':>9} {'query ms':>9} {'p95 ms':>7}")
+    for n in sizes:
+        titles = [t.lower() for t in synthetic_titles(n)]
+        bodies = [synthetic_body(rnd, vocabulary) for _ in range(n)]
+        start = time.perf_counter()
+        index = BM25Index([build_part(titles, bodies)])
+        build = time.perf_counter() - start
+        times = sorted(timed(lambda: index.top_k(query, k=10), 3)[0] for query in queries)
+        entries = sum(len(posting[0]) for posting in index.postings.values())
+        print(f"{n:>8} {build:>8.1f} {entries:>9} {sum(times) / len(times) * 1e3:>9.2f} "
+              f"{times[int(len(times) * 0.95)] * 1e3:>7.2f}")
+
+
+def legacy_extract(file_path):
+    # extract_summary's regex pipeline plus extract_image, two reads per file
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    content = re.sub(r'<style.*?>.*?</style>', '', content, flags=re.DOTALL)
+    content = re.sub(r'<script.*?>.*?</script>', '', content, flags=re.DOTALL)
+    content = re.sub(r'<div class="meta-info">.*?</div>', '', content, flags=re.DOTALL)
+    content = re.sub(r'<table.*?>.*?</table>', '', content, flags=re.DOTALL)
+    text = ' '.join(html.unescape(re.sub('<[^<]+?>', ' ', content)).split())
+    with open(file_path, 'r', encoding='utf-8') as f:
+        match = re.search(r'<img[^>]+src=["\']([^"\']+)["\']', f.read())
+    return text, match.group(1) if match else None
+
+
+def bench_extract(docs):
+    with tempfile.TemporaryDirectory() as base_dir:
+        start = time.perf_counter()
+        make_corpus(base_dir, docs)
+        print(f"generated {docs} posts in {time.perf_counter() - start:.1f}s")
+        files = [os.path.join(root, "index.html") for root, _, names in os.walk(base_dir) if "index.html" in names]
+
+        legacy_time, _ = timed(lambda: [legacy_extract(path) for path in files], 1)
+        stream_time, _ = timed(lambda: [extract_page(path) for path in files], 1)
+        print(f"corpus build:  regex {legacy_time:.2f}s  single-pass {stream_time:.2f}s")
+
+        # Large pages: a 1MB table, and unclosed <table> tags, which make the
+        # non-greedy DOTALL pattern rescan to the end of the page for each one
+        # (the regex cost grows much faster than the page: ~1.8s at 250 tags,
+        # ~15s at 500)
+        rnd = random.Random(1)
+        row = "<tr>" + "".join(f"<td>{rnd.choice(WORDS)}</td>" for _ in range(20)) + "</tr>"
+        pages = {
+            "1MB table": "<html><body><p>본문.</p><table>" + row * 4000 + "</table></body></html>",
+            "250 open tables": "<html><body>" + "<table><p>본문 내용입니다.</p>" * 250 + "</body></html>",
+        }
+        for name, page in pages.items():
+            path = os.path.join(base_dir, "large.html")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(page)
+            legacy_time, _ = timed(lambda: legacy_extract(path), 1)
+            stream_time, _ = timed(lambda: extract_page(path), 1)
+            print(f"{name + ':':<17}regex {legacy_time * 1e3:.0f}ms  single-pass {stream_time * 1e3:.0f}ms")
+
+
+def bench_build(docs, workers):
+    with tempfile.TemporaryDirectory() as base_dir:
+        start = time.perf_counter()
+        make_corpus(base_dir, docs)
+        print(f"generated {docs} posts in {time.perf_counter() - start:.1f}s ({os.cpu_count()} CPUs)")
+        posts = scan_posts(base_dir)
+        print(f"{'workers':>8} {'build (s)':>10} {'speedup':>8}")
+        baseline = None
+        for count in workers:
+            build_time, _ = timed(lambda: build_index(base_dir, posts, workers=count), 1)
+            baseline = baseline or build_time
+            print(f"{count:>8} {build_time:>10.2f} {baseline / build_time:>7.1f}x")
+
+
+def bench_mapped(docs):
+    with tempfile.TemporaryDirectory() as base_dir:
+        make_corpus(base_dir, docs)
+        records, engine, file_state = build_index(base_dir, scan_posts(base_dir))
+        snapshot_path = os.path.join(base_dir, "snapshot.bin")
+        mapped_path = os.path.join(base_dir, "mapped.bin")
+        write_snapshot(snapshot_path, "", (records, engine, file_state))
+        write_mapped_index(mapped_path, "", records, engine)
+
+        def load(read):
+            # Heap a worker allocates for its copy of the index
+            tracemalloc.start()
+            start = time.perf_counter()
+            loaded = read()
+            elapsed = time.perf_counter() - start
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            return elapsed, size, loaded
+
+        snapshot_time, snapshot_heap, (_, (_, snapshot_engine, _)) = load(lambda: read_snapshot(snapshot_path))
+        mapped_time, mapped_heap, mapped = load(lambda: read_mapped_index(mapped_path, base_dir, engine.synonyms))
+        print(f"{docs} docs, snapshot {os.path.getsize(snapshot_path) / 1e6:.1f}MB, "
+              f"mapped file {os.path.getsize(mapped_path) / 1e6:.1f}MB")
+        print(f"{'index':>9} {'load ms':>8} {'heap MB':>8} {'substring us':>13} {'bm25 us':>8}")
+        titles = [record.title_lower for record in records]
+        queries = BROAD_QUERIES + selective_queries(titles)
+        for name, load_time, heap, loaded in (("snapshot", snapshot_time, snapshot_heap, snapshot_engine),
+                                             ("mapped", mapped_time, mapped_heap, mapped.engine)):
+            substring_time = sum(timed(lambda: loaded.substring_hits(query), 5)[0] for query in queries)
+            bm25_time = sum(timed(lambda: loaded.fulltext_match(query), 5)[0] for query in queries)
+            print(f"{name:>9} {load_time * 1e3:>8.0f} {heap / 1e6:>8.1f} "
+                  f"{substring_time / len(queries) * 1e6:>13.1f} {bm25_time / len(queries) * 1e6:>8.1f}")
+
+
+def skill_payloads(seed: int = 13):
+    """
+    A search result list_card response and a 10-card carousel response,
+    shaped like the ones skill_server builds.
+    """
+    rnd = random.Random(seed)
+    host = "https://estla-chatbot.onrender.com"
+    titles = [synthetic_title(rnd, rnd.randrange(20000)) for _ in range(10)]
+    vocabulary = synthetic_vocabulary(500)
+    list_response = {"version": "2.0", "template": {"outputs": [
+        {"simpleText": {"text": "'리모컨'와 관련된 문서를 37개 찾았습니다.\n원하시는 내용을 선택해주세요."}},
+        {"listCard": {
+            "header": {"title": "'리모컨' 검색 결과"},
+            "items": [{"title": title[:35], "description": rnd.choice(FOLDERS)[4:], "action": "message",
+                       "messageText": title} for title in titles[:5]],
+            "buttons": [
+                {"label": "더 보기 ➕", "action": "message", "messageText": "'리모컨' 검색 결과 더 보여줘"},
+                {"label": "🌐 전체보기", "action": "webLink", "webLinkUrl": f"{host}/index.html"},
+            ],
+        }},
+    ]}}
+    carousel_response = {"version": "2.0", "template": {"outputs": [
+        {"simpleText": {"text": "📋 자주 묻는 질문 목록입니다."}},
+        {"carousel": {"type": "basicCard", "items": [{
+            "title": title[:35],
+            "description": synthetic_body(rnd, vocabulary, 30)[:80] + "...",
+            "thumbnail": {"imageUrl": f"{host}/images/QnA/{urllib.parse.quote(title)}/image_1.png"},
+            "buttons": [{"action": "webLink", "label": "자세히 보기",
+                         "webLinkUrl": f"{host}/QnA/{urllib.parse.quote(title)}/index.html"}],
+        } for title in titles]}},
+    ], "quickReplies": [{"messageText": "홈으로", "action": "message", "label": "🏠 홈으로"}]}}
+    return [("list_card", list_response), ("carousel", carousel_response)]
+
+
+def bench_json(repeat):
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    encoders = [
+        # What returning the dict from an endpoint costs
+        ("fastapi dict", lambda content: JSONResponse(jsonable_encoder(content)).body),
+        ("stdlib", lambda content: json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")),
+    ]
+    if orjson is not None:
+        encoders.append(("orjson", orjson.dumps))
+    print(f"json_response.dumps uses {'orjson' if orjson is not None else 'the stdlib'}")
+    print(f"{'payload':>10} {'encoder':>13} {'us':>8} {'bytes':>7}")
+    for name, content in skill_payloads():
+        # json.dumps defaults (\uXXXX escapes, ", " and ": ") for scale
+        print(f"{name:>10} {'json default':>13} {timed(lambda: json.dumps(content).encode(), repeat)[0] * 1e6:>8.1f} "
+              f"{len(json.dumps(content).encode()):>7}")
+        for encoder_name, encode in encoders:
+            elapsed, body = timed(lambda: encode(content), repeat)
+            assert body == dumps(content)
+            print(f"{name:>10} {encoder_name:>13} {elapsed * 1e6:>8.1f} {len(body):>7}")
+
+
+def skill_request(utterance: str, contexts: int = 0) -> bytes:
+    """
+    An OpenBuilder fallback skill payload as the server receives it.
+    """
+    user_key = "f" * 64
+    block = {"id": "5f1e2d3c4b5a69788796a5b4", "name": "폴백 블록"}
+    return json.dumps({
+        "intent": {**block, "extra": {"reason": {"code": 1, "message": "OK"}}},
+        "userRequest": {
+            "timezone": "Asia/Seoul",
+            "params": {"ignoreMe": "true", "surface": "Kakaotalk.plusfriend"},
+            "block": block,
+            "utterance": utterance,
+            "lang": "ko",
+            "user": {"id": user_key, "type": "botUserKey",
+                     "properties": {"botUserKey": user_key, "plusfriendUserKey": "AbCdEfGh1234", "isFriend": True}},
+        },
+        "contexts": [{"name": f"search_{i}", "lifeSpan": 5, "ttl": 600,
+                      "params": {"query": {"value": "리모컨", "resolvedValue": "리모컨"},
+                                 "offset": {"value": "5", "resolvedValue": "5"}}} for i in range(contexts)],
+        "bot": {"id": "5f1e2d3c4b5a69788796a5b5", "name": "이스트라 챗봇"},
+        "action": {"name": "fallback_skill", "clientExtra": None, "params": {}, "id": "5f1e2d3c4b5a69788796a5b6",
+                   "detailParams": {}},
+    }, ensure_ascii=False).encode("utf-8")
+
+
+def bench_decode(repeat):
+    def untyped(loads):
+        # What fallback read before: the whole body as dicts, then .get()s
+        def decode(body):
+            user_request = loads(body).get("userRequest", {})
+            return user_request.get("utterance", ""), (user_request.get("user") or {}).get("id")
+        return decode
+
+    def typed(body):
+        request = KakaoRequest.decode(body)
+        user = request.userRequest.user
+        return request.userRequest.utterance, user.id if user else None
+
+    decoders = [("json.loads", untyped(json.loads)), ("KakaoRequest", typed)]
+    if orjson is not None:
+        decoders.insert(1, ("orjson.loads", untyped(orjson.loads)))
+    print(f"{'payload':>16} {'bytes':>6} {'decoder':>13} {'us':>6}")
+    for name, body in (("minimal", json.dumps({"userRequest": {"utterance": "리모컨 연결"}}).encode()),
+                       ("fallback", skill_request("리모컨 연결")),
+                       ("with 3 contexts", skill_request("리모컨 연결", 3))):
+        for decoder_name, decode in decoders:
+            elapsed, result = timed(lambda: decode(body), repeat)
+            print(f"{name:>16} {len(body):>6} {decoder_name:>13} {elapsed * 1e6:>6.1f}")
+
+
+# Keyword lists of the if/elif cascade fallback used before intents.json
+LEGACY_OTT = ["넷플", "유튜브", "영화", "드라마", "ott", "영상", "디즈니", "티빙", "웨이브"]
+LEGACY_GAME = ["게임", "플스", "xbox", "닌텐도", "스위치", "롤", "배그", "디아블로", "마비노기", "오버워치", "스팀",
+               "ps5", "ps4"]
+LEGACY_GENERAL = ["방송", "효도", "뉴스", "아침", "부모님", "안방", "거실"]
+LEGACY_ANY = ["상관", "아무거나", "모름", "그냥", "추천", "모르겠어", "걍"]
+
+
+def legacy_intent(u):
+    # The cascade's branch for a normalized utterance; "products" is only
+    # reached after search finds nothing
+    if any(k == u for k in ["시작", "홈으로", "처음으로", "start", "home"]):
+        return "home"
+    if "챗봇 사용법" in u or "사용법" in u:
+        return "usage"
+    if "나에게 맞는 TV" in u:
+        return "tv_recommend"
+    if any(k in u for k in LEGACY_OTT):
+        return "tv_ott"
+    if any(k in u for k in LEGACY_GAME):
+        return "tv_game"
+    if any(k in u for k in LEGACY_GENERAL) or any(k in u for k in LEGACY_ANY):
+        return "tv_general"
+    if "tv" in u.lower() or "티비" in u:
+        return "tv_prompt"
+    if "더 보여줘" in u:
+        return "more"
+    if any(k in u for k in ["자가 진단", "Selftest", "진단", "테스트"]):
+        return "selftest"
+    if any(k in u for k in ["QnA", "자주 묻는 질문", "질문", "전체 목록", "리스트"]):
+        return "qna"
+    if "상담원 연결 안내" in u:
+        return "agent"
+    if "홈페이지" in u:
+        return "homepage"
+    if "배송조회" in u or "배송 조회" in u or u == "배송":
+        return "delivery"
+    if "회사" in u or "소개" in u:
+        return "company"
+    if any(k in u for k in ["상품", "제품", "모델"]):
+        return "products"
+    return None
+
+
+def intent_utterances(n: int, seed: int = 0):
+    # Keywords, their truncations and filler, glued together so utterances
+    # straddle keyword boundaries and hit several intents at once
+    keywords = LEGACY_OTT + LEGACY_GAME + LEGACY_GENERAL + LEGACY_ANY + [
+        "시작", "홈으로", "start", "사용법", "나에게 맞는 TV", "tv", "TV", "Tv", "티비", "더 보여줘", "자가 진단",
+        "진단", "QnA", "질문", "전체 목록", "상담원 연결 안내", "홈페이지", "배송조회", "배송 조회", "배송", "회사",
+        "소개", "상품", "모델"]
+    pieces = (keywords + [k[:-1] for k in keywords if len(k) > 1] + [k[1:] for k in keywords if len(k) > 1]
+              + ["리모컨", " ", "a", "설정", "x", "T", "v", "배", "송"])
+    rnd = random.Random(seed)
+    return [("".join(rnd.choice(pieces) for _ in range(rnd.randint(1, 4)))) for _ in range(n)] + keywords
+
+
+def bench_intents(n):
+    handlers = {"welcome": {}, "more_results": {}, "category_menu": {"category": CATEGORY_FOLDERS}}
+    table = load_intents(os.path.join(os.path.dirname(os.path.abspath(__file__)), "intents.json"), "", handlers)
+
+    def routed(u):
+        # What fallback does with the matches: the first intent that answers
+        # before search, else the first one that answers after it
+        intents = table.matches(u)
+        for intent in intents:
+            if not intent.after_search:
+                return intent.name
+        return intents[0].name if intents else None
+
+    utterances = intent_utterances(n)
+    mismatches = [u for u in utterances if routed(u) != legacy_intent(u)]
+    print(f"{len(mismatches)} mismatches over {len(utterances)} utterances (intents.json {table.version})")
+    for u in mismatches[:10]:
+        print(f"  {u!r}: cascade {legacy_intent(u)}, intents.json {routed(u)}")
+    real = ["리모컨 설정 방법", "화면이 안나와요", "넷플릭스 연결", "QnA 더 보여줘", "와이파이 연결이 안돼요", "배송",
+            "상담원 연결 안내"]
+    print(f"{'router':>10} {'us/utterance':>13}")
+    for name, route in (("cascade", legacy_intent), ("automaton", routed)):
+        elapsed, _ = timed(lambda: [route(u) for u in real], 20000)
+        print(f"{name:>10} {elapsed / len(real) * 1e6:>13.2f}")
+
+
+async def asgi_post(app, path: str, body: bytes):
+    # One POST through the ASGI app, as uvicorn would deliver it; returns
+    # (status, response body)
+    scope = {"type": "http", "method": "POST", "path": path, "raw_path": path.encode(), "query_string": b"",
+             "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+             "http_version": "1.1", "scheme": "http", "server": ("127.0.0.1", 8000),
+             "client": ("127.0.0.1", 50000), "root_path": "", "app": app}
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop() if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[0]["status"], b"".join(message.get("body", b"") for message in sent[1:])
+
+
+def bench_static(repeat):
+    # Imported here: the server indexes its content on import
+    with contextlib.redirect_stdout(io.StringIO()):
+        import skill_server
+    from fastapi import FastAPI, Request
+
+    # The endpoints as they were: the response dict built per request and
+    # encoded by FastAPI, the body parsed as plain JSON
+    legacy = FastAPI()
+
+    @legacy.post("/api/welcome")
+    async def legacy_welcome(request: Request):
+        return skill_server.get_welcome_response()
+
+    @legacy.post("/api/fallback")
+    async def legacy_fallback(request: Request):
+        data = await request.json()
+        utterance = skill_server.normalize_utterance(data.get("userRequest", {}).get("utterance", ""))
+        return skill_server.fallback_response(utterance)
+
+    cases = [("/api/welcome", "")] + [("/api/fallback", utterance) for utterance in (
+        "시작", "사용법", "나에게 맞는 TV", "넷플", "자가 진단", "자주 묻는 질문", "상담원 연결 안내", "홈페이지",
+        "배송조회", "회사 소개")]
+
+    async def run():
+        print(f"{'endpoint':>13} {'utterance':>12} {'legacy us':>10} {'server us':>10}")
+        for path, utterance in cases:
+            body = skill_request(utterance)
+            timings = []
+            for app in (legacy, skill_server.app):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    status, response = await asgi_post(app, path, body)
+                    assert status == 200
+                    start = time.perf_counter()
+                    for _ in range(repeat):
+                        await asgi_post(app, path, body)
+                timings.append((time.perf_counter() - start) / repeat)
+                if app is legacy:
+                    expected = json.loads(response)
+            assert json.loads(response) == expected, (path, utterance)
+            print(f"{path:>13} {utterance:>12} {timings[0] * 1e6:>10.1f} {timings[1] * 1e6:>10.1f}")
+
+    asyncio.run(run())
+
+
+def bench_reindex(docs, edits):
+    # Imported here: the server indexes its content on import
+    with contextlib.redirect_stdout(io.StringIO()):
+        import skill_server
+
+    def rankings(generation, queries):
+        # Full-text results by post, with their scores: equal maps mean the
+        # same ranking, whatever doc ids the two indexes gave the posts
+        engine, records = generation.engine, generation.records
+        return [{(records[doc_id].category, records[doc_id].title): round(score, 9)
+                 for doc_id, score in engine.bm25.top_k(engine.canonical(query.lower()), k=len(records))}
+                for query in queries]
+
+    queries = BROAD_QUERIES + ["에러 깜빡임", "리모컨 전원", "와이파이 업데이트 에러", "소리 안나와요", "자막 설정"]
+    with tempfile.TemporaryDirectory() as base_dir:
+        make_corpus(base_dir, docs)
+        with contextlib.redirect_stdout(io.StringIO()):
+            indexer = skill_server.ContentIndexer(base_dir)
+        rnd = random.Random(17)
+        posts = sorted((folder, title) for folder in FOLDERS for title in os.listdir(os.path.join(base_dir, folder)))
+        picked = rnd.sample(posts, 2 * edits)
+        for folder, title in picked[:edits]:
+            write_post(base_dir, folder, title, " ".join(rnd.choice(WORDS) for _ in range(100)))
+        for folder, title in picked[edits:]:
+            shutil.rmtree(os.path.join(base_dir, folder, title))
+        for i in range(edits):
+            write_post(base_dir, FOLDERS[i % len(FOLDERS)], f"새 게시물 {i}",
+                       " ".join(rnd.choice(WORDS) for _ in range(300)))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            indexer.update_index()
+            update_time = time.perf_counter() - start
+            start = time.perf_counter()
+            fresh = skill_server.ContentIndexer(base_dir)
+            build_time = time.perf_counter() - start
+        mismatches = [query for query, updated, built in
+                      zip(queries, rankings(indexer.current, queries), rankings(fresh.current, queries))
+                      if updated != built]
+    print(f"{docs} posts, {edits} edited / removed / added: update_index {update_time * 1000:.0f} ms, "
+          f"full build {build_time * 1000:.0f} ms")
+    print(f"{len(mismatches)} of {len(queries)} full-text rankings differ from a fresh build: {mismatches}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+def legacy_record(title, category, summary, image_src, base_dir, host_base_url):
+    # The per-document dict reload_index used to build
+    folder_name = CATEGORY_FOLDERS[category]
+    safe_folder = urllib.parse.quote(folder_name)
+    safe_title = urllib.parse.quote(title)
+    web_path = f"/{safe_folder}/{safe_title}/index.html"
+    image_url = None
+    if image_src:
+        image_url = f"{host_base_url}/{safe_folder}/{safe_title}/{image_src}"
+    return {
+        "title": title,
+        "category": category,
+        "path": web_path,
+        "full_path": os.path.join(base_dir, folder_name, title, "index.html"),
+        "summary": summary,
+        "image_url": image_url,
+        "link": host_base_url + web_path
+    }
+
+
+def bench_memory(sizes):
+    host_base_url = "https://estla-chatbot.onrender.com"
+    base_dir = "/opt/render/project/src/HTML_Conversion"
+    DocRecord.host_base_url = host_base_url
+    categories = list(CATEGORY_FOLDERS)
+
+    def measure(build):
+        tracemalloc.start()
+        kept = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del kept
+        return size
+
+    print(f"{'docs':>8} {'dict B/doc':>11} {'slots B/doc':>12} {'saved':>7}")
+    for n in sizes:
+        rnd = random.Random(3)
+        titles = synthetic_titles(n)
+        # Summaries and titles are the same strings in both layouts, so only
+        # what each layout adds on top of them is measured.
+        summaries = [" ".join(rnd.choice(WORDS) for _ in range(120))[:800] for _ in range(n)]
+        images = [f"image_{i}.png" if i % 2 else None for i in range(n)]
+        rows = [(titles[i], categories[i % 3], summaries[i], images[i]) for i in range(n)]
+
+        legacy = measure(lambda: [
+            (legacy_record(t, c, s, img, base_dir, host_base_url), t.lower()) for t, c, s, img in rows
+        ])
+        compact = measure(lambda: [DocRecord(t, c, s, img, base_dir) for t, c, s, img in rows])
+        print(f"{n:>8} {legacy / n:>11.0f} {compact / n:>12.0f} {1 - compact / legacy:>7.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ngram = sub.add_parser("ngram", help="substring search: n-gram index vs. linear title scan")
+    ngram.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000, 50000])
+
+    memory = sub.add_parser("memory", help="per-document record memory: dict vs. DocRecord")
+    memory.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+
+    fuzzy = sub.add_parser("fuzzy", help="typo matching: prebuilt fuzzy matcher vs. difflib over all titles")
+    fuzzy.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+
+    bm25 = sub.add_parser("bm25", help="full-text BM25 build time and top-k latency")
+    bm25.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+
+    jamo = sub.add_parser("jamo", help="chosung/jamo-typo queries: title fuzzy stage vs. jamo indexes")
+    jamo.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+
+    extract = sub.add_parser("extract", help="HTML extraction: regex pipeline vs. single streaming pass")
+    extract.add_argument("--docs", type=int, default=500)
+
+    build = sub.add_parser("build", help="full index build time by worker process count")
+    build.add_argument("--docs", type=int, default=20000)
+    build.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+
+    mapped = sub.add_parser("mapped", help="worker index load: pickled snapshot vs. mmap'd index file")
+    mapped.add_argument("--docs", type=int, default=20000)
+
+    encode = sub.add_parser("json", help="skill response encoding: FastAPI's dict path vs. stdlib vs. orjson")
+    encode.add_argument("--repeat", type=int, default=2000)
+
+    decode = sub.add_parser("decode", help="/api/fallback body decoding: json dicts vs. typed KakaoRequest")
+    decode.add_argument("--repeat", type=int, default=20000)
+
+    intents = sub.add_parser("intents", help="fallback routing: intents.json automaton vs. the old if/elif cascade")
+    intents.add_argument("--utterances", type=int, default=200000)
+
+    static = sub.add_parser("static", help="/api/welcome and menu intents: per-request dicts vs. pre-encoded bodies")
+    static.add_argument("--repeat", type=int, default=3000)
+
+    reindex = sub.add_parser("reindex", help="check: full-text rankings after update_index vs. a fresh build")
+    reindex.add_argument("--docs", type=int, default=300)
+    reindex.add_argument("--edits", type=int, default=5)
+
+    args = parser.parse_args()
+    if args.command == "ngram":
+        bench_ngram(args.sizes)
+    elif args.command == "memory":
+        bench_memory(args.sizes)
+    elif args.command == "fuzzy":
+        bench_fuzzy(args.sizes)
+    elif args.command == "bm25":
+        bench_bm25(args.sizes)
+    elif args.command == "jamo":
+        bench_jamo(args.sizes)
+    elif args.command == "extract":
+        bench_extract(args.docs)
+    elif args.command == "build":
+        bench_build(args.docs, args.workers)
+    elif args.command == "mapped":
+        bench_mapped(args.docs)
+    elif args.command == "json":
+        bench_json(args.repeat)
+    elif args.command == "decode":
+        bench_decode(args.repeat)
+    elif args.command == "intents":
+        bench_intents(args.utterances)
+    elif args.command == "static":
+        bench_static(args.repeat)
+    elif args.command == "reindex":
+        bench_reindex(args.docs, args.edits)
+
+
+if __name__ == "__main__":
+    main()
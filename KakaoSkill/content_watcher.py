@@ -0,0 +1,220 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+from typing import Callable, Dict, Hashable, Optional
+
+from doc_store import CATEGORY_FOLDERS, scan_posts
+from index_snapshot import content_fingerprint
+
+# --- Content Watcher ---
+# Notices new, edited and removed posts under BASE_DIR and calls back once a
+# burst of changes has settled. Uses inotify on Linux (via libc, no extra
+# dependency) and falls back to polling the post tree's fingerprint.
+
+# inotify(7) event bits
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+_EVENT = struct.Struct("iIII")
+
+
+class _Inotify:
+    """
+    Watches base_dir, its category folders and every post folder (the three
+    levels scan_posts looks at). Raises OSError if inotify is unavailable or
+    the watch limit is reached, so the caller can poll instead.
+    """
+
+    def __init__(self, base_dir: str):
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is Linux only")
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.base_dir = os.path.abspath(base_dir)
+        self.dirs: Dict[int, str] = {}
+        try:
+            self._watch_tree(self.base_dir)
+        except OSError:
+            self.close()
+            raise
+
+    def _watch(self, path: str):
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return  # gone already; its parent's event covers it
+            raise OSError(err, f"inotify_add_watch failed for {path}")
+        self.dirs[wd] = path
+
+    def _depth(self, path: str) -> int:
+        rel = os.path.relpath(path, self.base_dir)
+        return 0 if rel == "." else rel.count(os.sep) + 1
+
+    def _watch_tree(self, path: str):
+        depth = self._depth(path)
+        if depth == 1 and os.path.basename(path) not in CATEGORY_FOLDERS.values():
+            return
+        self._watch(path)
+        if depth < 2:
+            try:
+                names = os.listdir(path)
+            except OSError:
+                return
+            for name in names:
+                child = os.path.join(path, name)
+                if os.path.isdir(child):
+                    self._watch_tree(child)
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        """
+        Waits up to timeout seconds for events. Returns True if any arrived.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        data = b""
+        while True:
+            try:
+                chunk = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not chunk:
+                break
+            data += chunk
+        pos = 0
+        while pos + _EVENT.size <= len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, pos)
+            name = data[pos + _EVENT.size:pos + _EVENT.size + length].rstrip(b"\0")
+            pos += _EVENT.size + length
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+            elif mask & IN_Q_OVERFLOW:
+                # Events were lost; rewatch anything that may be new
+                self._watch_tree(self.base_dir)
+            elif mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and wd in self.dirs:
+                self._watch_tree(os.path.join(self.dirs[wd], os.fsdecode(name)))
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class ContentWatcher:
+    """
+    Background thread that calls on_change() after posts under base_dir
+    change, once no further change has been seen for `debounce` seconds.
+    on_change runs on the watcher thread.
+    """
+
+    def __init__(self, base_dir: str, on_change: Callable[[], None],
+                 debounce: float = 2.0, poll_interval: float = 10.0,
+                 fingerprint: Optional[Callable[[], Hashable]] = None):
+        self.base_dir = base_dir
+        # Polled instead of watching the post tree if given (e.g. to follow
+        # a single file)
+        self.fingerprint = fingerprint
+        self.on_change = on_change
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.mode = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="content-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+            self._thread = None
+
+    def _run(self):
+        if self.fingerprint is not None:
+            self.mode = "poll"
+            self._poll()
+            return
+        try:
+            notify = _Inotify(self.base_dir)
+        except OSError as e:
+            print(f"Content watcher: inotify unavailable ({e}), polling every {self.poll_interval:g}s.")
+            self.mode = "poll"
+            self._poll()
+            return
+        self.mode = "inotify"
+        print(f"Content watcher: watching {len(notify.dirs)} folders under {self.base_dir}.")
+        try:
+            while not self._stop.is_set():
+                # Wake up now and then to notice stop()
+                if not notify.wait(1.0):
+                    continue
+                # Debounce: wait for the burst to go quiet
+                while notify.wait(self.debounce) and not self._stop.is_set():
+                    pass
+                self._fire()
+            return
+        except OSError as e:
+            # E.g. a new post folder past fs.inotify.max_user_watches (ENOSPC)
+            print(f"Content watcher: inotify failed ({e}), polling every {self.poll_interval:g}s.")
+        finally:
+            notify.close()
+        self.mode = "poll"
+        # The change that hit the error hasn't been picked up yet
+        self._fire()
+        self._poll()
+
+    def _poll(self):
+        last = self._current()
+        while not self._stop.wait(self.poll_interval):
+            current = self._current()
+            if current == last:
+                continue
+            # Debounce: rescan until two scans in a row agree
+            while not self._stop.wait(self.debounce):
+                settled = self._current()
+                if settled == current:
+                    break
+                current = settled
+            last = current
+            self._fire()
+
+    def _current(self) -> Hashable:
+        if self.fingerprint is not None:
+            return self.fingerprint()
+        return content_fingerprint(scan_posts(self.base_dir))
+
+    def _fire(self):
+        if self._stop.is_set():
+            return
+        try:
+            self.on_change()
+        except Exception as e:
+            print(f"Content watcher: reload failed: {e}")
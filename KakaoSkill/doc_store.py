@@ -0,0 +1,130 @@
+import hashlib
+import os
+import sys
+import urllib.parse
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+# --- Document Store ---
+
+CATEGORY_FOLDERS = {
+    "QnA": "크롤링_QnA",
+    "Selftest": "크롤링_selftest_MD",
+    "Products": "크롤링_Products"
+}
+
+
+PostKey = Tuple[str, str]  # (category, post folder name)
+
+
+class FileState(NamedTuple):
+    """
+    What an indexed post's index.html looked like when it was last read.
+    """
+    doc_id: int
+    size: int
+    mtime_ns: int
+    digest: bytes
+
+
+def scan_posts(base_dir: str) -> Dict[PostKey, Tuple[str, int, int]]:
+    """
+    Finds every <category folder>/<post>/index.html under base_dir.
+    Returns {(category, post_title): (index_file, size, mtime_ns)} in
+    directory listing order.
+    """
+    posts = {}
+    for category_name, folder_name in CATEGORY_FOLDERS.items():
+        cat_path = os.path.join(base_dir, folder_name)
+        if not os.path.isdir(cat_path):
+            continue
+        for post_title in os.listdir(cat_path):
+            index_file = os.path.join(cat_path, post_title, "index.html")
+            try:
+                st = os.stat(index_file)
+            except OSError:
+                continue
+            posts[(category_name, post_title)] = (index_file, st.st_size, st.st_mtime_ns)
+    return posts
+
+
+def file_identity(path: str) -> Optional[Tuple[int, int, int]]:
+    """
+    (inode, size, mtime) of a file, or None if it doesn't exist. Changes
+    whenever the file is edited or replaced.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def file_digest(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).digest()
+
+
+class DocRecord:
+    """
+    One indexed post. Only the parts that differ per document are stored;
+    URLs are kept relative and expanded against `host_base_url` when a card
+    is rendered. Supports item['title'] / item.get('summary') so card
+    helpers can treat it like the plain dicts they are also given.
+    """
+    __slots__ = ("title", "title_lower", "category", "summary", "image_src", "base_dir")
+
+    # Set by skill_server once HOST_BASE_URL is known
+    host_base_url = ""
+
+    KEYS = frozenset(("title", "category", "path", "full_path", "summary", "image_url", "link"))
+
+    def __init__(self, title: str, category: str, summary: str, image_src: Optional[str], base_dir: str):
+        self.title = title
+        self.title_lower = title.lower()
+        self.category = sys.intern(category)
+        self.summary = summary
+        self.image_src = image_src
+        self.base_dir = base_dir
+
+    @property
+    def folder(self) -> str:
+        return CATEGORY_FOLDERS[self.category]
+
+    @property
+    def path(self) -> str:
+        return f"/{urllib.parse.quote(self.folder)}/{urllib.parse.quote(self.title)}/index.html"
+
+    @property
+    def full_path(self) -> str:
+        return os.path.join(self.base_dir, self.folder, self.title, "index.html")
+
+    @property
+    def link(self) -> str:
+        return self.host_base_url + self.path
+
+    @property
+    def image_url(self) -> Optional[str]:
+        if not self.image_src:
+            return None
+        # Handle relative paths
+        if self.image_src.startswith("http"):
+            return self.image_src
+        safe_folder = urllib.parse.quote(self.folder)
+        safe_title = urllib.parse.quote(self.title)
+        return f"{self.host_base_url}/{safe_folder}/{safe_title}/{self.image_src}"
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.KEYS
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key not in self.KEYS:
+            return default
+        return getattr(self, key)
+
+    def __repr__(self):
+        return f"DocRecord({self.category}/{self.title})"
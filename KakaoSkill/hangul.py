@@ -0,0 +1,54 @@
+from typing import Dict
+
+# --- Hangul Decomposition ---
+# Precomputed str.translate tables over the 11,172 precomposed syllables
+# (U+AC00..U+D7A3), so decomposing a title is one C-level pass.
+
+CHOSUNG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+JUNGSUNG = "ㅏㅐㅑㅒㅓㅔㅕㅖㅗㅘㅙㅚㅛㅜㅝㅞㅟㅠㅡㅢㅣ"
+JONGSUNG = ["", "ㄱ", "ㄲ", "ㄳ", "ㄴ", "ㄵ", "ㄶ", "ㄷ", "ㄹ", "ㄺ", "ㄻ", "ㄼ", "ㄽ", "ㄾ",
+            "ㄿ", "ㅀ", "ㅁ", "ㅂ", "ㅄ", "ㅅ", "ㅆ", "ㅇ", "ㅈ", "ㅊ", "ㅋ", "ㅌ", "ㅍ", "ㅎ"]
+
+SYLLABLE_FIRST = 0xAC00
+SYLLABLE_COUNT = len(CHOSUNG) * len(JUNGSUNG) * len(JONGSUNG)
+
+_JAMO_TABLE: Dict[int, str] = {}
+_CHOSUNG_TABLE: Dict[int, str] = {}
+for _index in range(SYLLABLE_COUNT):
+    _lead, _rest = divmod(_index, len(JUNGSUNG) * len(JONGSUNG))
+    _vowel, _tail = divmod(_rest, len(JONGSUNG))
+    _JAMO_TABLE[SYLLABLE_FIRST + _index] = CHOSUNG[_lead] + JUNGSUNG[_vowel] + JONGSUNG[_tail]
+    _CHOSUNG_TABLE[SYLLABLE_FIRST + _index] = CHOSUNG[_lead]
+
+_CHOSUNG_SET = frozenset(CHOSUNG)
+
+# Postpositions a noun may end with ("리모컨으로", "연결이")
+PARTICLES = ("에서", "으로", "이", "가", "을", "를", "은", "는", "에", "의", "도", "로", "와", "과")
+
+
+def decompose(text: str) -> str:
+    """
+    Spells every syllable out as compatibility jamo ("리모컨" -> "ㄹㅣㅁㅗㅋㅓㄴ"),
+    so a one-jamo typo costs one character instead of a whole syllable.
+    Other characters are kept.
+    """
+    return text.translate(_JAMO_TABLE)
+
+
+def chosung(text: str) -> str:
+    """
+    Initial consonants of every syllable, spaces dropped ("리모컨 설정" ->
+    "ㄹㅁㅋㅅㅈ"). Other characters are kept.
+    """
+    return "".join(text.translate(_CHOSUNG_TABLE).split())
+
+
+def is_chosung_query(text: str) -> bool:
+    """
+    True if the text contains a bare initial consonant ("ㄹㅁㅋ", "ㄹㅁㅋ 설정").
+    """
+    return any(ch in _CHOSUNG_SET for ch in text)
+
+
+def is_syllable(ch: str) -> bool:
+    return "가" <= ch <= "힣"
@@ -0,0 +1,156 @@
+import codecs
+import hashlib
+import html
+import re
+from typing import NamedTuple, Optional
+
+# --- HTML Extraction ---
+# One forward pass per post: readable text, first image and <title>.
+# Replaces four DOTALL `.*?` substitutions plus a tag-stripping pass (and a
+# second read of the file for the image). Those rescan to the end of the
+# file for every unclosed <table>/<style>/..., which is quadratic on large
+# pages; here every character is looked at once.
+
+CHUNK_SIZE = 64 * 1024
+
+# Next thing of interest: the start of a dropped block, or any other tag.
+# Dropped blocks are removed without leaving a space, other tags become a
+# space, matching the old regex pipeline.
+META_INFO_OPEN = '<div class="meta-info">'
+TOKEN_RE = re.compile(r'<(style|script|table)|' + re.escape(META_INFO_OPEN) + r'|<[^<]+?>')
+TAG_RE = re.compile(r'<[^<]+?>')
+IMG_RE = re.compile(r'<img[^>]+src=["\']([^"\']+)["\']')
+
+BLOCK_CLOSE = {
+    "style": "</style>",
+    "script": "</script>",
+    "table": "</table>",
+    "div": "</div>",  # meta-info; like the old pattern, ends at the first </div>
+}
+
+# How far back an <img ...> tag may start before the newest chunk
+IMG_OVERLAP = 2048
+
+
+class ExtractedPage(NamedTuple):
+    text: Optional[str]       # whitespace-collapsed text, None if unreadable
+    image_src: Optional[str]  # src of the first <img>
+    title: Optional[str]      # contents of <title>
+    digest: Optional[bytes]   # SHA-1 of the file, None if not read to the end
+
+
+class _Scanner:
+    def __init__(self):
+        self.buf = ""
+        self.parts = []
+        self.raw_len = 0
+        self.image_src = None
+        self.title = None
+        self.title_start = None
+        # Position after which a block's closing tag is known to be absent
+        self.no_close = {}
+
+    def feed(self, data: str, final: bool = False):
+        if self.image_src is None:
+            overlap = self.buf[-IMG_OVERLAP:] if self.buf else ""
+            match = IMG_RE.search(overlap + data)
+            if match:
+                self.image_src = match.group(1)
+        self.buf += data
+        self.buf = self.buf[self._scan(final):]
+
+    def _text(self, text: str):
+        if text:
+            self.parts.append(text)
+            self.raw_len += len(text)
+
+    def _scan(self, final: bool) -> int:
+        """
+        Consumes buf as far as it can be decided; returns where to resume.
+        """
+        buf = self.buf
+        pos = 0
+        while True:
+            match = TOKEN_RE.search(buf, pos)
+            if match is None:
+                if final:
+                    self._text(buf[pos:])
+                    return len(buf)
+                # Hold back a possibly incomplete tag
+                lt = buf.rfind("<", pos)
+                end = lt if lt != -1 else len(buf)
+                self._text(buf[pos:end])
+                return end
+
+            start = match.start()
+            self._text(buf[pos:start])
+            block = match.group(1) or ("div" if match.group() == META_INFO_OPEN else None)
+            if block:
+                end = self._block_end(buf, start, block, final)
+                if end is None:
+                    return start  # wait for more data
+                if end != -1:
+                    pos = end
+                    continue
+                # Never closed: the old pattern didn't match, so it's an ordinary tag
+                match = TAG_RE.match(buf, start)
+                if match is None:
+                    if final:
+                        self._text(buf[start:])
+                        return len(buf)
+                    return start
+
+            tag = match.group()
+            if self.title is None:
+                if tag.startswith("<title"):
+                    self.title_start = len(self.parts)
+                elif tag.startswith("</title") and self.title_start is not None:
+                    self.title = " ".join(html.unescape("".join(self.parts[self.title_start:])).split())
+            self.parts.append(" ")
+            pos = match.end()
+
+    def _block_end(self, buf: str, start: int, block: str, final: bool) -> Optional[int]:
+        """
+        End of the dropped block opening at start; -1 if it is never closed,
+        None if that can't be known until more data arrives.
+        """
+        if self.no_close.get(block, len(buf) + 1) <= start:
+            return -1
+        open_end = buf.find(">", start)
+        close = -1 if open_end == -1 else buf.find(BLOCK_CLOSE[block], open_end + 1)
+        if close == -1:
+            if not final:
+                return None
+            self.no_close[block] = start
+            return -1
+        return close + len(BLOCK_CLOSE[block])
+
+    def text(self) -> str:
+        return " ".join(html.unescape("".join(self.parts)).split())
+
+
+def extract_page(file_path: str, max_text: Optional[int] = None) -> ExtractedPage:
+    """
+    Reads the post once, in chunks. With max_text, stops as soon as that
+    much text and an image have been seen (the text is then a prefix and
+    no digest is returned); without it the whole file is read and hashed.
+    """
+    scanner = _Scanner()
+    sha1 = hashlib.sha1()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        with open(file_path, "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    scanner.feed(decoder.decode(b"", final=True), final=True)
+                    break
+                sha1.update(chunk)
+                scanner.feed(decoder.decode(chunk))
+                if (max_text is not None and scanner.raw_len >= max_text
+                        and scanner.image_src is not None and len(scanner.text()) >= max_text):
+                    return ExtractedPage(scanner.text(), scanner.image_src, scanner.title, None)
+    except Exception as e:
+        print(f"Error reading {file_path}: {e}")
+        return ExtractedPage(None, None, None, None)
+    return ExtractedPage(scanner.text(), scanner.image_src, scanner.title, sha1.digest())
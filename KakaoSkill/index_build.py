@@ -0,0 +1,136 @@
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from doc_store import CATEGORY_FOLDERS, DocRecord, FileState, PostKey
+from html_extract import extract_page
+from search_index import IndexPart, SearchIndex, build_part
+from synonyms import SynonymTable
+
+# --- Index Build ---
+# Reads posts and builds the search engine, optionally across a process
+# pool. Kept free of import-time side effects so worker processes can
+# import it (skill_server builds the module-level indexer on import).
+
+SUMMARY_LEN = 800
+
+# Posts per worker task: large enough to amortise pickling the partial
+# postings back, small enough to balance work across workers
+CHUNK_SIZE = 500
+
+
+class IndexGeneration(NamedTuple):
+    """
+    One complete build of the content index. Never modified once published:
+    changes produce a new generation, so a reader holding one sees a
+    consistent set of records and postings.
+    """
+    number: int
+    records: List[Optional[DocRecord]]  # by doc id, None once removed
+    engine: SearchIndex
+    file_state: Dict[PostKey, FileState]
+    fingerprint: Optional[str]
+    categories: Dict[str, List[DocRecord]]  # see category_buckets
+    layout: str  # see layout_digest
+
+
+def category_buckets(records: List[Optional[DocRecord]]) -> Dict[str, List[DocRecord]]:
+    """
+    Live records per category, sorted by title so menus don't depend on
+    directory listing order or on which posts were reindexed last.
+    """
+    buckets: Dict[str, List[DocRecord]] = {category: [] for category in CATEGORY_FOLDERS}
+    for record in records:
+        if record is not None:
+            buckets[record.category].append(record)
+    for bucket in buckets.values():
+        bucket.sort(key=lambda record: record.title)
+    return buckets
+
+
+def layout_digest(records: List[Optional[DocRecord]]) -> str:
+    """
+    Identifies which post holds each doc id. Search breaks score ties by
+    doc id, so two indexes of the same content rank alike only if this
+    matches too: doc ids follow build and reindex order, not the content.
+    """
+    keys = "\n".join(f"{record.category}/{record.title}" if record is not None else "" for record in records)
+    return hashlib.sha1(keys.encode("utf-8")).hexdigest()
+
+
+def summarize(text: Optional[str]) -> str:
+    """
+    Truncates extracted text to a ~800 char preview.
+    """
+    if text is None:
+        return "내용을 미리볼 수 없습니다."
+    max_len = SUMMARY_LEN
+    if len(text) > max_len:
+        # Try to find the last period before max_len
+        last_period = text.rfind('.', 0, max_len)
+        if last_period != -1:
+            return text[:last_period+1]
+        return text[:max_len] + "..."
+    return text
+
+
+def read_post(base_dir: str, category_name: str, post_title: str, index_file: str):
+    """
+    Extracts one post in a single pass. Returns its record, full text and
+    file digest.
+    """
+    page = extract_page(index_file)
+    # URLs stay relative until a card is rendered (see DocRecord)
+    record = DocRecord(post_title, category_name, summarize(page.text), page.image_src, base_dir)
+    return record, page.text or "", page.digest
+
+
+def _build_chunk(base_dir: str, start: int, chunk: List[Tuple[PostKey, str]], synonyms: Optional[SynonymTable]):
+    records, digests, bodies = [], [], []
+    for (category_name, post_title), index_file in chunk:
+        record, text, digest = read_post(base_dir, category_name, post_title, index_file)
+        records.append(record)
+        digests.append(digest)
+        # Full text only feeds the BM25 postings, it isn't kept
+        bodies.append(text)
+    part = build_part([record.title_lower for record in records], bodies, start, synonyms)
+    return records, digests, part
+
+
+def build_index(base_dir: str, posts: Dict[PostKey, Tuple[str, int, int]], workers: int = 1,
+                synonyms: Optional[SynonymTable] = None):
+    """
+    Reads every post from scan_posts() and builds the engine. Doc ids follow
+    the order of posts whatever the worker count, so the result is identical
+    to a sequential build. Returns (records, engine, file_state).
+    """
+    items = [(key, index_file) for key, (index_file, _, _) in posts.items()]
+    chunks = [(start, items[start:start + CHUNK_SIZE]) for start in range(0, len(items), CHUNK_SIZE)]
+
+    if workers > 1 and len(chunks) > 1:
+        # Prefer fork: spawned workers re-run the launching script, and
+        # skill_server builds an indexer at import time
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            # map() yields in submission order, i.e. doc id order
+            results = list(pool.map(_build_chunk, [base_dir] * len(chunks), [start for start, _ in chunks],
+                                    [chunk for _, chunk in chunks], [synonyms] * len(chunks)))
+    else:
+        results = [_build_chunk(base_dir, start, chunk, synonyms) for start, chunk in chunks]
+
+    records: List[DocRecord] = []
+    digests = []
+    parts: List[IndexPart] = []
+    for chunk_records, chunk_digests, part in results:
+        records.extend(chunk_records)
+        digests.extend(chunk_digests)
+        parts.append(part)
+
+    file_state = {
+        key: FileState(doc_id, size, mtime_ns, digest)
+        for doc_id, ((key, (_, size, mtime_ns)), digest) in enumerate(zip(posts.items(), digests))
+    }
+    engine = SearchIndex([record.title_lower for record in records], parts=parts or None, synonyms=synonyms)
+    return records, engine, file_state
@@ -0,0 +1,471 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_right
+from collections.abc import Mapping, Sequence
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from doc_store import CATEGORY_FOLDERS, DocRecord
+from index_build import layout_digest
+from search_index import FuzzyMatcher, NgramIndex, SearchIndex
+from synonyms import SynonymTable
+
+# --- Mapped Index ---
+# Read-only on-disk form of a content index for multi-worker deployments
+# (`uvicorn skill_server:app --workers N`). Workers mmap the same file and
+# query it in place, so records and postings sit once in the page cache
+# instead of once per process, and loading it is just parsing the header.
+#
+# Layout: MAGIC | version (u32) | header length (u32) | header (JSON) | sections
+# The header holds the fingerprint, the scalar fields and
+# {section: [offset, length, typecode]}, offsets counted from the first
+# section; sections are native-endian arrays aligned to 8 bytes. Three
+# shapes are built from them:
+#   strings   <name>.off (n + 1 offsets into <name>.dat, UTF-8), <name>.nul
+#             (1 = None) for tables that may hold None
+#   keys      strings + <name>.slots: open addressing on crc32 of the UTF-8
+#             key, each slot holding key index + 1 (0 = empty)
+#   postings  keys + <name>.start (n + 1 offsets) into one array per column
+# Bump MAPPED_VERSION whenever the layout or the engine's shape changes.
+
+MAPPED_MAGIC = b"KSKMAP"
+MAPPED_VERSION = 3
+_HEADER = struct.Struct("<II")
+_ALIGN = 8
+
+
+class MappedStrings(Sequence):
+    """
+    Read-only list of strings (or None) decoded from the file on access.
+    The strings are stored back to back, so containing() can search all of
+    them with one scan of the mapped bytes.
+    """
+
+    def __init__(self, offsets: memoryview, data: memoryview, nulls: Optional[memoryview],
+                 buffer: mmap.mmap, start: int):
+        self.offsets = offsets
+        self.data = data
+        self.nulls = nulls
+        self.buffer = buffer  # the whole file; data begins at start
+        self.start = start
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        if i < 0:
+            i += len(self)
+        if self.nulls is not None and self.nulls[i]:
+            return None
+        return str(self.data[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+    def __iter__(self):
+        data, offsets, nulls = self.data, self.offsets, self.nulls
+        for i in range(len(self)):
+            yield None if nulls is not None and nulls[i] else str(data[offsets[i]:offsets[i + 1]], "utf-8")
+
+    def encoded_equals(self, i: int, encoded: bytes) -> bool:
+        return self.data[self.offsets[i]:self.offsets[i + 1]] == encoded
+
+    def containing(self, text: str) -> set:
+        """
+        Indexes of the strings containing text. UTF-8 never matches from
+        the middle of a character, so a byte match is a string match.
+        """
+        encoded = text.encode("utf-8")
+        if not encoded:
+            return {i for i, value in enumerate(self) if value is not None}
+        offsets, buffer, start = self.offsets, self.buffer, self.start
+        end = start + offsets[-1]
+        found = set()
+        position = buffer.find(encoded, start, end)
+        while position >= 0:
+            i = bisect_right(offsets, position - start) - 1
+            if position - start + len(encoded) <= offsets[i + 1]:
+                found.add(i)
+                position = start + offsets[i + 1]
+            else:
+                position += 1  # ran into the next string
+            position = buffer.find(encoded, position, end)
+        return found
+
+
+class MappedNgramIndex(NgramIndex):
+    """
+    NgramIndex over MappedStrings: queries too short for grams scan the
+    texts' bytes in the file instead of decoding every text.
+    """
+
+    def search(self, query: str) -> set:
+        if len(query) == 1:
+            return self.texts.containing(query)
+        return super().search(query)
+
+
+class MappedTable(Mapping):
+    """
+    Read-only dict over a key table; value(i) gives the value of key i.
+    Stands in for the engine's dicts (postings, exact titles, speller words).
+    """
+
+    def __init__(self, keys: MappedStrings, slots: memoryview, value: Callable[[int], Any]):
+        self.keys_ = keys
+        self.slots = slots
+        self.value = value
+
+    def _find(self, key: str) -> int:
+        slots = self.slots
+        if not slots:
+            return -1
+        encoded = key.encode("utf-8")
+        mask = len(slots) - 1
+        slot = zlib.crc32(encoded) & mask
+        while True:
+            i = slots[slot]
+            if not i:
+                return -1
+            if self.keys_.encoded_equals(i - 1, encoded):
+                return i - 1
+            slot = (slot + 1) & mask
+
+    def __getitem__(self, key: str):
+        i = self._find(key)
+        if i < 0:
+            raise KeyError(key)
+        return self.value(i)
+
+    def get(self, key: str, default=None):
+        i = self._find(key)
+        return default if i < 0 else self.value(i)
+
+    def __contains__(self, key) -> bool:
+        return self._find(key) >= 0
+
+    def __len__(self):
+        return len(self.keys_)
+
+    def __iter__(self):
+        return iter(self.keys_)
+
+
+class MappedRecord(DocRecord):
+    """
+    DocRecord that reads everything but its title from the file when it
+    is used: searches look at the titles of many more records than they
+    render.
+    """
+    __slots__ = ("_records", "_doc_id")
+
+    def __init__(self, title: str, records: "MappedRecords", doc_id: int):
+        self.title = title
+        self._records = records
+        self._doc_id = doc_id
+
+    @property
+    def title_lower(self) -> str:
+        return self.title.lower()
+
+    @property
+    def category(self) -> str:
+        return self._records.categories[self._doc_id]
+
+    @property
+    def summary(self) -> str:
+        return self._records.summaries[self._doc_id]
+
+    @property
+    def image_src(self) -> Optional[str]:
+        return self._records.images[self._doc_id]
+
+    @property
+    def base_dir(self) -> str:
+        return self._records.base_dir
+
+
+class MappedRecords(Sequence):
+    """
+    Records by doc id (None once removed), built on access.
+    """
+
+    def __init__(self, titles: MappedStrings, categories: MappedStrings, summaries: MappedStrings,
+                 images: MappedStrings, base_dir: str):
+        self.titles = titles
+        self.categories = categories
+        self.summaries = summaries
+        self.images = images
+        self.base_dir = base_dir
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __getitem__(self, doc_id: int) -> Optional[MappedRecord]:
+        if doc_id < 0:
+            doc_id += len(self)
+        title = self.titles[doc_id]
+        if title is None:
+            return None
+        return MappedRecord(title, self, doc_id)
+
+
+class MappedBucket(Sequence):
+    """
+    One category's records in menu order (see index_build.category_buckets).
+    """
+
+    def __init__(self, doc_ids: memoryview, records: MappedRecords):
+        self.doc_ids = doc_ids
+        self.records = records
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.records[doc_id] for doc_id in self.doc_ids[i]]
+        return self.records[self.doc_ids[i]]
+
+
+class MappedIndex(NamedTuple):
+    fingerprint: Optional[str]
+    records: MappedRecords
+    engine: SearchIndex
+    categories: Dict[str, MappedBucket]
+    layout: str  # see index_build.layout_digest
+
+
+# --- Writing ---
+
+class _Writer:
+    def __init__(self):
+        self.sections: List[Tuple[str, str, bytes]] = []
+
+    def add(self, name: str, data: array):
+        self.sections.append((name, data.typecode, data.tobytes()))
+
+    def strings(self, name: str, values, nullable: bool = False):
+        offsets = array('Q', [0])
+        data = bytearray()
+        nulls = array('B')
+        for value in values:
+            if value is not None:
+                data += value.encode("utf-8")
+            offsets.append(len(data))
+            nulls.append(value is None)
+        if nullable:
+            self.add(f"{name}.nul", nulls)
+        self.add(f"{name}.off", offsets)
+        self.sections.append((f"{name}.dat", "B", bytes(data)))
+
+    def keys(self, name: str, keys: List[str]):
+        self.strings(name, keys)
+        size = 8
+        while size < 2 * len(keys):
+            size *= 2
+        mask = size - 1
+        slots = array('I', bytes(4 * size))
+        for i, key in enumerate(keys):
+            slot = zlib.crc32(key.encode("utf-8")) & mask
+            while slots[slot]:
+                slot = (slot + 1) & mask
+            slots[slot] = i + 1
+        self.add(f"{name}.slots", slots)
+
+    def postings(self, name: str, postings: Dict[str, Any], typecodes: str):
+        """
+        postings values are one array, or a tuple of one array per typecode.
+        """
+        keys = list(postings)
+        self.keys(name, keys)
+        starts = array('Q', [0])
+        columns = [array(typecode) for typecode in typecodes]
+        for key in keys:
+            posting = postings[key]
+            for column, values in zip(columns, posting if isinstance(posting, tuple) else (posting,)):
+                column.extend(values)
+            starts.append(len(columns[0]))
+        self.add(f"{name}.start", starts)
+        for column_no, column in enumerate(columns):
+            self.add(f"{name}.{column_no}", column)
+
+    def write(self, path: str, header: Dict[str, Any]):
+        layout, position = {}, 0
+        for name, typecode, data in self.sections:
+            layout[name] = [position, len(data), typecode]
+            position += len(data) + (-len(data) % _ALIGN)
+        encoded = json.dumps({**header, "sections": layout}, ensure_ascii=False).encode("utf-8")
+        prefix = MAPPED_MAGIC + _HEADER.pack(MAPPED_VERSION, len(encoded)) + encoded
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(prefix)
+            f.write(bytes(-len(prefix) % _ALIGN))
+            for _, _, data in self.sections:
+                f.write(data)
+                f.write(bytes(-len(data) % _ALIGN))
+        # Workers keep serving the old inode until they remap
+        os.replace(tmp_path, path)
+
+
+def write_mapped_index(path: str, fingerprint: Optional[str], records: List[Optional[DocRecord]],
+                       engine: SearchIndex):
+    """
+    Writes records and engine (built in-process, not mapped) to path.
+    """
+    writer = _Writer()
+    writer.strings("records.title", [record.title if record else None for record in records], nullable=True)
+    writer.strings("records.category", [record.category if record else "" for record in records])
+    writer.strings("records.summary", [record.summary if record else "" for record in records])
+    writer.strings("records.image", [record.image_src if record else None for record in records], nullable=True)
+    for category in CATEGORY_FOLDERS:
+        doc_ids = [doc_id for doc_id, record in enumerate(records)
+                   if record is not None and record.category == category]
+        # Stable, so equal titles keep doc id order as in category_buckets
+        doc_ids.sort(key=lambda doc_id: records[doc_id].title)
+        writer.add(f"category.{category}", array('i', doc_ids))
+
+    writer.strings("titles", engine.titles, nullable=True)
+    writer.keys("exact", list(engine.exact))
+    writer.add("exact.doc", array('i', engine.exact.values()))
+    writer.keys("canonical_exact", list(engine.canonical_exact))
+    writer.add("canonical_exact.doc", array('i', engine.canonical_exact.values()))
+    writer.postings("title_grams", engine.title_grams.postings, "i")
+    writer.strings("chosung", engine.chosung_grams.texts, nullable=True)
+    writer.postings("chosung_grams", engine.chosung_grams.postings, "i")
+
+    speller = engine.speller
+    # Key index == word id, since word_ids was filled in words order
+    writer.keys("speller.words", speller.words)
+    writer.add("speller.counts", speller.counts)
+    writer.strings("speller.jamo", speller.grams.texts, nullable=True)
+    writer.postings("speller.grams", speller.grams.postings, "i")
+
+    bm25 = engine.bm25
+    writer.postings("bm25", bm25.postings, "iHH")
+    writer.add("bm25.title_lens", bm25.title_lens)
+    writer.add("bm25.body_lens", bm25.body_lens)
+    writer.add("bm25.title_norm", bm25.title_norm)
+    writer.add("bm25.body_norm", bm25.body_norm)
+    writer.add("bm25.deleted", array('i', sorted(bm25.deleted)))
+
+    writer.write(path, {
+        "fingerprint": fingerprint,
+        # Saves workers walking every record when they map the file
+        "layout": layout_digest(records),
+        "byteorder": sys.byteorder,
+        "synonyms": engine.synonyms.digest,
+        "bm25": {"doc_count": bm25.doc_count, "title_total": bm25.title_total, "body_total": bm25.body_total},
+    })
+
+
+# --- Reading ---
+
+class _Reader:
+    def __init__(self, buffer: mmap.mmap, base: int, sections: Dict[str, list]):
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.base = base
+        self.sections = sections
+
+    def array(self, name: str) -> memoryview:
+        offset, length, typecode = self.sections[name]
+        offset += self.base
+        return self.view[offset:offset + length].cast(typecode)
+
+    def strings(self, name: str) -> MappedStrings:
+        nulls = self.array(f"{name}.nul") if f"{name}.nul" in self.sections else None
+        return MappedStrings(self.array(f"{name}.off"), self.array(f"{name}.dat"), nulls,
+                             self.buffer, self.base + self.sections[f"{name}.dat"][0])
+
+    def keys(self, name: str, value: Callable[[int], Any]) -> MappedTable:
+        return MappedTable(self.strings(name), self.array(f"{name}.slots"), value)
+
+    def postings(self, name: str, columns: int = 1) -> MappedTable:
+        starts = self.array(f"{name}.start")
+        arrays = [self.array(f"{name}.{column_no}") for column_no in range(columns)]
+        if columns == 1:
+            column = arrays[0]
+            return self.keys(name, lambda i: column[starts[i]:starts[i + 1]])
+        return self.keys(name, lambda i: tuple(column[starts[i]:starts[i + 1]] for column in arrays))
+
+
+def read_mapped_index(path: str, base_dir: str, synonyms: SynonymTable) -> Optional[MappedIndex]:
+    """
+    Maps the file and assembles a read-only engine over it. Returns None if
+    it doesn't exist, has another version or byte order, or was built with
+    different synonyms.
+    """
+    try:
+        with open(path, "rb") as f:
+            # The mapping holds its own reference to the file
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None  # missing or empty
+    except Exception as e:
+        print(f"Error loading mapped index {path}: {e}")
+        return None
+
+    try:
+        return _assemble(path, buffer, base_dir, synonyms)
+    except Exception as e:
+        print(f"Error loading mapped index {path}: {e}")
+        return None
+
+
+def _assemble(path: str, buffer: mmap.mmap, base_dir: str, synonyms: SynonymTable) -> Optional[MappedIndex]:
+    start = len(MAPPED_MAGIC) + _HEADER.size
+    if buffer[:len(MAPPED_MAGIC)] != MAPPED_MAGIC:
+        print(f"Ignoring mapped index {path}: unknown format.")
+        return None
+    version, length = _HEADER.unpack(buffer[len(MAPPED_MAGIC):start])
+    if version != MAPPED_VERSION:
+        print(f"Ignoring mapped index {path}: version {version}, expected {MAPPED_VERSION}.")
+        return None
+    header = json.loads(buffer[start:start + length].decode("utf-8"))
+    if header["byteorder"] != sys.byteorder:
+        print(f"Ignoring mapped index {path}: written on a {header['byteorder']}-endian host.")
+        return None
+    if header["synonyms"] != synonyms.digest:
+        print(f"Ignoring mapped index {path}: built with different synonyms.")
+        return None
+
+    base = start + length
+    reader = _Reader(buffer, base + (-base % _ALIGN), header["sections"])
+    records = MappedRecords(reader.strings("records.title"), reader.strings("records.category"),
+                            reader.strings("records.summary"), reader.strings("records.image"), base_dir)
+    categories = {category: MappedBucket(reader.array(f"category.{category}"), records)
+                  for category in CATEGORY_FOLDERS}
+
+    # An empty engine with every container swapped for its mapped view;
+    # add() and remove() don't work on it
+    engine = SearchIndex([], synonyms=synonyms)
+    engine.titles = reader.strings("titles")
+    exact_docs = reader.array("exact.doc")
+    engine.exact = reader.keys("exact", exact_docs.__getitem__)
+    canonical_docs = reader.array("canonical_exact.doc")
+    engine.canonical_exact = reader.keys("canonical_exact", canonical_docs.__getitem__)
+    engine.title_grams = MappedNgramIndex(engine.titles, reader.postings("title_grams"))
+    engine.chosung_grams = MappedNgramIndex(reader.strings("chosung"), reader.postings("chosung_grams"))
+    engine.fuzzy = FuzzyMatcher(engine.title_grams)
+
+    speller = engine.speller
+    speller.word_ids = reader.keys("speller.words", lambda i: i)
+    speller.words = speller.word_ids.keys_
+    speller.counts = reader.array("speller.counts")
+    speller.grams = MappedNgramIndex(reader.strings("speller.jamo"), reader.postings("speller.grams"))
+    speller.matcher = FuzzyMatcher(speller.grams)
+
+    bm25 = engine.bm25
+    bm25.postings = reader.postings("bm25", columns=3)
+    bm25.title_lens = reader.array("bm25.title_lens")
+    bm25.body_lens = reader.array("bm25.body_lens")
+    bm25.title_norm = reader.array("bm25.title_norm")
+    bm25.body_norm = reader.array("bm25.body_norm")
+    bm25.deleted = set(reader.array("bm25.deleted"))
+    bm25.doc_count = header["bm25"]["doc_count"]
+    bm25.title_total = header["bm25"]["title_total"]
+    bm25.body_total = header["bm25"]["body_total"]
+
+    return MappedIndex(header["fingerprint"], records, engine, categories, header["layout"])
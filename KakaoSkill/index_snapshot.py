@@ -0,0 +1,77 @@
+import hashlib
+import os
+import pickle
+import struct
+from typing import Dict, List, Optional, Tuple
+
+from doc_store import DocRecord, FileState, PostKey
+from search_index import SearchIndex
+
+# --- Index Snapshot ---
+# Prebuilt index written by `python skill_server.py --build-snapshot` so a
+# cold start can skip re-reading every HTML file.
+#
+# Layout: MAGIC | version (u32) | fingerprint length (u32) | fingerprint | pickle
+# Bump SNAPSHOT_VERSION whenever DocRecord or SearchIndex change shape;
+# older files are then ignored and the server rebuilds.
+
+SNAPSHOT_MAGIC = b"KSKIDX"
+SNAPSHOT_VERSION = 5
+_HEADER = struct.Struct("<II")
+
+
+def content_fingerprint(posts: Dict[PostKey, Tuple[str, int, int]]) -> str:
+    """
+    Hash of every indexed post's name, size and mtime (from scan_posts).
+    Changes whenever a post is added, removed or edited.
+    """
+    entries = sorted(f"{category}/{title}\0{size}\0{mtime_ns}"
+                     for (category, title), (_, size, mtime_ns) in posts.items())
+    return hashlib.sha1("\n".join(entries).encode("utf-8")).hexdigest()
+
+
+Snapshot = Tuple[List[Optional[DocRecord]], SearchIndex, Dict[PostKey, FileState]]
+
+
+def write_snapshot(path: str, fingerprint: str, snapshot: Snapshot):
+    payload = pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+    encoded = fingerprint.encode("ascii")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(_HEADER.pack(SNAPSHOT_VERSION, len(encoded)))
+        f.write(encoded)
+        f.write(payload)
+    # Readers never see a half-written file
+    os.replace(tmp_path, path)
+
+
+def read_snapshot_fingerprint(f) -> Optional[str]:
+    if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+        return None
+    header = f.read(_HEADER.size)
+    if len(header) != _HEADER.size:
+        return None
+    version, length = _HEADER.unpack(header)
+    if version != SNAPSHOT_VERSION:
+        return None
+    return f.read(length).decode("ascii")
+
+
+def read_snapshot(path: str) -> Optional[Tuple[str, Snapshot]]:
+    """
+    Returns (fingerprint, (records, engine, file_state)) if the snapshot
+    exists and has the current version.
+    """
+    try:
+        with open(path, "rb") as f:
+            fingerprint = read_snapshot_fingerprint(f)
+            if fingerprint is None:
+                print(f"Ignoring index snapshot {path}: unknown format or version.")
+                return None
+            return fingerprint, pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Error loading index snapshot {path}: {e}")
+        return None
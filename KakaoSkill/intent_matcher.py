@@ -0,0 +1,86 @@
+from collections import deque
+from typing import Dict, Iterable, List
+
+# --- Intent Matcher ---
+# The fallback handler's keyword intents, compiled into one Aho-Corasick
+# automaton so an utterance is read once instead of once per keyword.
+
+
+class IntentMatcher:
+    """
+    Keyword intents in priority order (the order add() is called in). An
+    intent matches if the utterance contains one of its `contains`
+    keywords or equals one of its `equals` keywords, exactly as the
+    sequential `any(k in utterance ...)` checks did; match_bits() sets bit i
+    for every matching intent i.
+
+    Once every intent is added, compile() builds the automaton: the
+    keyword trie plus a failure link per node. Only the trie's edges are
+    stored, so its size follows the total keyword length however many
+    intents there are; matching follows failure links where a character
+    has no edge, which costs at most one step back per character read.
+    """
+
+    def __init__(self):
+        self.intents: List[str] = []
+        self.equals: Dict[str, int] = {}  # keyword -> bitmask of intents
+        self.keywords: Dict[str, int] = {}
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[int] = [0]
+
+    def add(self, intent: str, contains: Iterable[str] = (), equals: Iterable[str] = ()):
+        bit = 1 << len(self.intents)
+        self.intents.append(intent)
+        for keyword in equals:
+            self.equals[keyword] = self.equals.get(keyword, 0) | bit
+        for keyword in contains:
+            self.keywords[keyword] = self.keywords.get(keyword, 0) | bit
+
+    def compile(self):
+        # Trie of the keywords
+        goto: List[Dict[str, int]] = [{}]
+        out = [0]
+        for keyword, bits in self.keywords.items():
+            node = 0
+            for ch in keyword:
+                child = goto[node].get(ch)
+                if child is None:
+                    child = goto[node][ch] = len(goto)
+                    goto.append({})
+                    out.append(0)
+                node = child
+            out[node] |= bits
+
+        # Breadth first, so shorter nodes' links are set before they're
+        # followed: a node's failure target is the longest proper suffix of
+        # its keyword prefix in the trie, and it outputs whatever that does
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in goto[node].items():
+                target = fail[node]
+                while target and ch not in goto[target]:
+                    target = fail[target]
+                fail[child] = goto[target].get(ch, 0) if node else 0
+                out[child] |= out[fail[child]]
+                queue.append(child)
+        self.goto = goto
+        self.fail = fail
+        self.out = out
+
+    def match_bits(self, text: str) -> int:
+        """
+        Bitmask of the intents the text matches. contains keywords added
+        since the last compile() aren't seen.
+        """
+        found = self.equals.get(text, 0)
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            found |= out[state]
+        return found
@@ -0,0 +1,156 @@
+import hashlib
+import json
+from typing import Any, Callable, Collection, Dict, List, Mapping, NamedTuple, Optional
+
+from intent_matcher import IntentMatcher
+
+# --- Intent Table ---
+# The fallback handler's keyword intents as data (intents.json): keywords,
+# match mode, priority and either a response template or the name of a
+# handler in skill_server. Compiled once into an IntentMatcher and ready
+# responses, both as dicts and as encoded bodies; a reload compiles a new
+# table and swaps it in whole.
+#
+# Entry fields:
+#   name          unique intent name
+#   priority      lower wins when several intents match
+#   contains      keywords matched anywhere in the utterance
+#   equals        keywords the whole utterance must equal
+#   after_search  only used when search finds nothing (default false)
+#   response      response template; "{host}" becomes HOST_BASE_URL
+#   handler       instead of response: a handler name, called with params
+#   params        the handler's arguments, checked against its HandlerParams
+
+
+# Handler name -> its params -> the values each may take
+HandlerParams = Mapping[str, Mapping[str, Collection[Any]]]
+
+
+class Intent(NamedTuple):
+    name: str
+    priority: int
+    contains: List[str]
+    equals: List[str]
+    after_search: bool
+    response: Optional[Dict[str, Any]]  # shared between requests: don't modify
+    handler: Optional[str]
+    params: Dict[str, Any]
+    body: Optional[bytes]  # response, encoded by the table's render function
+
+
+def fill_template(template: Any, host_base_url: str) -> Any:
+    if isinstance(template, str):
+        return template.replace("{host}", host_base_url)
+    if isinstance(template, list):
+        return [fill_template(value, host_base_url) for value in template]
+    if isinstance(template, dict):
+        return {key: fill_template(value, host_base_url) for key, value in template.items()}
+    return template
+
+
+class IntentTable:
+    """
+    Compiled intents. Never modified once built, so a request holding one
+    routes consistently while a reload replaces it.
+    """
+
+    def __init__(self, intents: List[Intent], version: str = ""):
+        # Stable sort: equal priorities keep file order
+        self.intents = sorted(intents, key=lambda intent: intent.priority)
+        self.version = version
+        self.matcher = IntentMatcher()
+        for intent in self.intents:
+            self.matcher.add(intent.name, contains=intent.contains, equals=intent.equals)
+        self.matcher.compile()
+
+    def matches(self, utterance: str) -> List[Intent]:
+        """
+        Every intent the utterance matches, highest priority first.
+        """
+        found = self.matcher.match_bits(utterance)
+        matched = []
+        while found:
+            # Lowest set bit first: intents are in priority order
+            bit = found & -found
+            matched.append(self.intents[bit.bit_length() - 1])
+            found ^= bit
+        return matched
+
+    def __len__(self):
+        return len(self.intents)
+
+
+def check_params(name: str, handler: str, params: Any, handlers: HandlerParams) -> Dict[str, Any]:
+    if handler not in handlers:
+        raise ValueError(f"intent {name!r}: unknown handler {handler!r}")
+    if not isinstance(params, dict):
+        raise ValueError(f"intent {name!r}: params must be an object")
+    expected = handlers[handler]
+    if set(params) != set(expected):
+        raise ValueError(f"intent {name!r}: handler {handler!r} takes params {sorted(expected)}, "
+                         f"got {sorted(params)}")
+    for param, value in params.items():
+        if not isinstance(value, str) or value not in expected[param]:
+            raise ValueError(f"intent {name!r}: {param} must be one of {sorted(expected[param])}, got {value!r}")
+    return dict(params)
+
+
+def compile_intents(entries: List[Dict[str, Any]], host_base_url: str,
+                    handlers: HandlerParams = {}, version: str = "",
+                    render: Optional[Callable[[Any], bytes]] = None) -> IntentTable:
+    """
+    Checks and compiles intents.json entries. Raises ValueError naming the
+    first bad entry. With render, static responses are also encoded once
+    into Intent.body.
+    """
+    intents = []
+    names = set()
+    for number, entry in enumerate(entries, 1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"intent #{number}: expected an object")
+        name = entry.get("name")
+        if not isinstance(name, str) or name in names:
+            raise ValueError(f"intent #{number}: missing or duplicate name {name!r}")
+        names.add(name)
+        contains, equals = entry.get("contains", []), entry.get("equals", [])
+        if not (isinstance(contains, list) and isinstance(equals, list)):
+            raise ValueError(f"intent {name!r}: contains and equals must be lists")
+        if not (contains or equals):
+            raise ValueError(f"intent {name!r}: no contains or equals keywords")
+        if not all(isinstance(keyword, str) and keyword for keyword in [*contains, *equals]):
+            raise ValueError(f"intent {name!r}: keywords must be non-empty strings")
+        priority = entry.get("priority", number)
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise ValueError(f"intent {name!r}: priority must be an integer")
+        response, handler = entry.get("response"), entry.get("handler")
+        if (response is None) == (handler is None):
+            raise ValueError(f"intent {name!r}: needs exactly one of response or handler")
+        params = {}
+        if handler is not None:
+            params = check_params(name, handler, entry.get("params", {}), handlers)
+        elif "params" in entry:
+            raise ValueError(f"intent {name!r}: params need a handler")
+        elif not isinstance(response, dict):
+            raise ValueError(f"intent {name!r}: response must be an object")
+        if response is not None:
+            response = fill_template(response, host_base_url)
+        intents.append(Intent(
+            name, priority, list(contains), list(equals),
+            bool(entry.get("after_search", False)), response, handler, params,
+            render(response) if render is not None and response is not None else None,
+        ))
+    return IntentTable(intents, version)
+
+
+def load_intents(path: str, host_base_url: str, handlers: HandlerParams = {},
+                 render: Optional[Callable[[Any], bytes]] = None) -> IntentTable:
+    """
+    Reads and compiles the intents file. Raises OSError or ValueError
+    (json.JSONDecodeError included) if it can't be used.
+    """
+    with open(path, "rb") as f:
+        raw = f.read()
+    entries = json.loads(raw.decode("utf-8"))
+    if not isinstance(entries, list):
+        raise ValueError("expected a list of intents")
+    return compile_intents(entries, host_base_url, handlers, hashlib.sha1(raw).hexdigest()[:12], render)
@@ -0,0 +1,35 @@
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# --- JSON Responses ---
+# Skill responses are plain dicts of str/int/bool/None/list built by the
+# handlers, so they can go straight to an encoder: no jsonable_encoder walk.
+# orjson when installed, else the stdlib with the same compact output
+# Starlette's JSONResponse writes (UTF-8 text unescaped, no spaces).
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Compact UTF-8 JSON for a skill response. Raises TypeError for values
+    that aren't plain JSON types.
+    """
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class SkillJSONResponse(JSONResponse):
+    """
+    JSONResponse encoded with dumps. Return an instance from an endpoint
+    (rather than the dict) so FastAPI doesn't run jsonable_encoder first.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
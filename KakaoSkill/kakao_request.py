@@ -0,0 +1,76 @@
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+from starlette.requests import Request
+
+# --- Kakao Skill Requests ---
+# The parts of an OpenBuilder skill payload the fallback router reads. The
+# models are decoded straight from the body bytes by pydantic-core: the
+# JSON is checked against these fields' types and everything else (bot,
+# intent, block, detailParams, ...) is skipped without building Python
+# objects for it. Fields default so a bare {"userRequest": {"utterance":
+# ...}}, as test_chatbot.html sends, still decodes.
+
+
+class User(BaseModel):
+    id: str
+    type: Optional[str] = None
+
+
+class UserRequest(BaseModel):
+    utterance: str = ""
+    user: Optional[User] = None
+
+
+class Action(BaseModel):
+    clientExtra: Optional[Dict[str, Any]] = None
+
+
+class Context(BaseModel):
+    name: str
+    lifeSpan: int = 0
+    params: Dict[str, Any] = {}
+
+
+class KakaoRequest(BaseModel):
+    # Factories, not instances: a model default is deep-copied per request
+    userRequest: UserRequest = Field(default_factory=UserRequest)
+    action: Action = Field(default_factory=Action)
+    contexts: List[Context] = Field(default_factory=list)
+
+    def context_params(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        The params of the named active context as plain values (each
+        arrives as {"value": ..., "resolvedValue": ...}), or None.
+        """
+        for context in self.contexts:
+            if context.name == name:
+                return {key: param.get("value") if isinstance(param, dict) else param
+                        for key, param in context.params.items()}
+        return None
+
+    @classmethod
+    def decode(cls, body: bytes) -> "KakaoRequest":
+        """
+        Raises ValidationError for malformed JSON or a payload that doesn't
+        fit the schema.
+        """
+        return cls.model_validate_json(body)
+
+
+async def read_body(request: Request, limit: int) -> Optional[bytes]:
+    """
+    The request body, or None once it's known to exceed limit bytes:
+    from Content-Length before anything is read, else while streaming.
+    """
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > limit:
+        return None
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+    return b"".join(chunks)
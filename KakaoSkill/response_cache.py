@@ -0,0 +1,67 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+# --- Response Cache ---
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of serialized responses (or any other values, e.g.
+    paging cursors) with a time-to-live; put() restarts an entry's. Entries
+    belong to one generation (any hashable, e.g. content index generation
+    and intent table version); the first lookup made with a different one
+    empties the cache. maxsize=0 disables caching.
+    Not thread-safe: used from the event loop only.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = None
+        self.entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _check_generation(self, generation: Hashable):
+        if generation != self.generation:
+            self.entries.clear()
+            self.generation = generation
+
+    def get(self, key: Hashable, generation: Hashable) -> Optional[Any]:
+        self._check_generation(generation)
+        entry = self.entries.get(key)
+        if entry is not None:
+            body, expires = entry
+            if expires > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return body
+            del self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, generation: Hashable, body: Any) -> Any:
+        if self.maxsize <= 0:
+            return body
+        self._check_generation(generation)
+        self.entries[key] = (body, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return body
+
+    def discard(self, key: Hashable):
+        self.entries.pop(key, None)
+
+    def stats(self) -> Dict[str, object]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "generation": self.generation,
+        }
@@ -0,0 +1,750 @@
+import copy
+import difflib
+import heapq
+import math
+import re
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from hangul import PARTICLES, chosung, decompose, is_chosung_query
+from synonyms import SynonymTable
+
+# --- Search Index ---
+# Built once per reload_index() from the indexed titles and body texts.
+# Documents are addressed by their integer position in ContentIndexer.index.
+
+# Runs of Hangul, or runs of other word characters (latin, digits)
+WORD_RE = re.compile(r'[가-힣]+|[^\W_가-힣]+')
+
+
+def analyze(text: str) -> List[str]:
+    """
+    Splits text into BM25 terms. Hangul words become overlapping syllable
+    bigrams so that particles don't hide a match ("리모컨이" still shares
+    "리모"/"모컨" with "리모컨"); other words are kept whole.
+    """
+    terms = []
+    for word in WORD_RE.findall(text.lower()):
+        if len(word) > 1 and '가' <= word[0] <= '힣':
+            terms.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            terms.append(word)
+    return terms
+
+
+def char_grams(text: str, n: int) -> set:
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def writable_posting(postings: Dict, key: str, owned: Optional[set]):
+    """
+    postings[key], or None. With owned (the keys already copied, see
+    SearchIndex.copy) a posting still shared with the source index is
+    copied first. owned is None for an index that owns all its postings.
+    """
+    posting = postings.get(key)
+    if owned is not None and key not in owned:
+        owned.add(key)
+        if posting is not None:
+            posting = postings[key] = posting[:] if isinstance(posting, array) else tuple(a[:] for a in posting)
+    return posting
+
+
+def add_grams(postings: Dict[str, array], doc_id: int, text: str, owned: Optional[set] = None):
+    # Doc ids only grow, so appending keeps every posting sorted
+    for gram in char_grams(text, 2) | char_grams(text, 3):
+        posting = writable_posting(postings, gram, owned)
+        if posting is None:
+            posting = postings[gram] = array('i')
+        posting.append(doc_id)
+
+
+def add_terms(postings: Dict[str, Tuple[array, array, array]], title_lens: array, body_lens: array,
+              doc_id: int, title: str, body: str, owned: Optional[set] = None):
+    title_terms = Counter(analyze(title))
+    body_terms = Counter(analyze(body))
+    title_lens.append(min(sum(title_terms.values()), 0xFFFF))
+    body_lens.append(sum(body_terms.values()))
+    for term in title_terms.keys() | body_terms.keys():
+        posting = writable_posting(postings, term, owned)
+        if posting is None:
+            posting = postings[term] = (array('i'), array('H'), array('H'))
+        posting[0].append(doc_id)
+        posting[1].append(min(title_terms.get(term, 0), 0xFFFF))
+        posting[2].append(min(body_terms.get(term, 0), 0xFFFF))
+
+
+class IndexPart(NamedTuple):
+    """
+    Postings for a contiguous run of doc ids. Parts are built independently
+    (e.g. in worker processes) and concatenated in doc id order.
+    """
+    gram_postings: Dict[str, array]
+    chosung_postings: Dict[str, array]  # grams of chosung(title)
+    term_postings: Dict[str, Tuple[array, array, array]]
+    title_lens: array
+    body_lens: array
+
+
+def build_part(titles: List[str], bodies: List[str], start: int = 0,
+               synonyms: Optional[SynonymTable] = None) -> IndexPart:
+    """
+    Indexes titles/bodies as doc ids start, start + 1, ... Titles must be
+    lowercased; both are canonicalized with synonyms first.
+    """
+    if synonyms is not None:
+        titles = [synonyms.canonical(title) for title in titles]
+        bodies = [synonyms.canonical(body.lower()) for body in bodies]
+    part = IndexPart({}, {}, {}, array('H'), array('I'))
+    for offset, (title, body) in enumerate(zip(titles, bodies)):
+        add_grams(part.gram_postings, start + offset, title)
+        add_grams(part.chosung_postings, start + offset, chosung(title))
+        add_terms(part.term_postings, part.title_lens, part.body_lens, start + offset, title, body)
+    return part
+
+
+def merge_postings(postings: List[Dict]) -> Dict:
+    """
+    Concatenates per-part postings in place (the first part's arrays are
+    extended); parts must be in doc id order so every posting stays sorted.
+    """
+    merged = postings[0]
+    for part in postings[1:]:
+        for term, posting in part.items():
+            target = merged.get(term)
+            if target is None:
+                merged[term] = posting
+            elif isinstance(posting, array):
+                target.extend(posting)
+            else:
+                for target_array, part_array in zip(target, posting):
+                    target_array.extend(part_array)
+    return merged
+
+
+class NgramIndex:
+    """
+    Character bigram/trigram postings over a list of lowercased texts.
+    Korean titles have no reliable word boundaries, so substring lookups
+    go through character grams instead of words: every gram of the query
+    must occur in a matching text, which gives a small candidate set that
+    is then verified with a plain `in` check.
+    """
+
+    # Stop intersecting once the candidate set is this small; verifying a
+    # handful of texts is cheaper than touching more posting lists.
+    VERIFY_THRESHOLD = 32
+
+    # Grams whose postings this copy no longer shares (see copy); None when
+    # it shares none
+    owned: Optional[set] = None
+
+    def __init__(self, texts: List[Optional[str]], postings: Optional[Dict[str, array]] = None):
+        # Shared with the owner, which appends new texts and sets removed
+        # ones to None before calling add()/remove()
+        self.texts = texts
+        if postings is None:
+            postings = {}
+            for doc_id, text in enumerate(texts):
+                if text is not None:
+                    add_grams(postings, doc_id, text)
+        self.postings: Dict[str, array] = postings
+
+    def copy(self, texts: List[Optional[str]]) -> "NgramIndex":
+        """
+        A copy over texts (the new owner's copy of the list) that shares the
+        posting arrays with this index until it changes them.
+        """
+        index = copy.copy(self)
+        index.texts = texts
+        index.postings = dict(self.postings)
+        index.owned = set()
+        return index
+
+    def add(self, doc_id: int, text: str):
+        add_grams(self.postings, doc_id, text, self.owned)
+
+    def remove(self, doc_id: int, text: str):
+        for gram in char_grams(text, 2) | char_grams(text, 3):
+            posting = writable_posting(self.postings, gram, self.owned)
+            posting.remove(doc_id)
+            if not posting:
+                del self.postings[gram]
+
+    def candidates(self, query: str) -> Optional[set]:
+        """
+        Doc ids that may contain the query, or None if the query is too
+        short to be answered from grams (single characters).
+        """
+        n = 3 if len(query) >= 3 else 2
+        grams = char_grams(query, n)
+        if not grams:
+            return None
+        postings = []
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if posting is None:
+                return set()
+            postings.append(posting)
+        postings.sort(key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            if len(result) <= self.VERIFY_THRESHOLD:
+                break
+            result.intersection_update(posting)
+        return result
+
+    def search(self, query: str) -> set:
+        """
+        Doc ids whose text contains the query.
+        """
+        if len(query) in (2, 3):
+            # The query is its only gram, so its posting is the exact answer
+            return set(self.postings.get(query, ()))
+        candidates = self.candidates(query)
+        if candidates is None:
+            # Single character: nothing to look up, scan the texts
+            return {doc_id for doc_id, text in enumerate(self.texts) if text is not None and query in text}
+        texts = self.texts
+        return {doc_id for doc_id in candidates if query in texts[doc_id]}
+
+
+class FuzzyMatcher:
+    """
+    Typo-tolerant title matching for the last search stage.
+    Replaces difflib.get_close_matches over every title: candidates come
+    from shared bigrams/trigrams with the query, only a short list of them
+    is scored with the same SequenceMatcher ratio difflib uses.
+    """
+
+    SHORTLIST = 64
+    # Upper bound on posting entries read per query. Grams are read rarest
+    # first, so the common ones that would dominate the cost are the ones
+    # skipped, and the work stays flat as the corpus grows.
+    POSTINGS_BUDGET = 20000
+
+    def __init__(self, grams: NgramIndex):
+        self.grams = grams
+
+    def _overlap(self, query: str) -> Dict[int, int]:
+        """
+        Shared gram count per candidate doc id, within the postings budget.
+        """
+        postings = [self.grams.postings[g] for g in char_grams(query, 2) | char_grams(query, 3)
+                    if g in self.grams.postings]
+        postings.sort(key=len)
+
+        overlap: Dict[int, int] = {}
+        budget = self.POSTINGS_BUDGET
+        for posting in postings:
+            if len(posting) > budget:
+                break
+            budget -= len(posting)
+            for doc_id in posting:
+                overlap[doc_id] = overlap.get(doc_id, 0) + 1
+        return overlap
+
+    def candidates(self, query: str) -> int:
+        """
+        Number of documents match() would consider for the query.
+        """
+        return len(self._overlap(query))
+
+    def match(self, query: str, n: int = 5, cutoff: float = 0.4) -> List[int]:
+        """
+        Doc ids of the n best matches scoring at least cutoff, best first.
+        """
+        texts = self.grams.texts
+        overlap = self._overlap(query)
+
+        # Dice-style estimate, which tracks the 2*M/T shape of ratio()
+        query_len = len(query)
+        shortlist = heapq.nlargest(
+            self.SHORTLIST, overlap,
+            key=lambda doc_id: overlap[doc_id] / (len(texts[doc_id]) + query_len)
+        )
+
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(query)
+        scored = []
+        for doc_id in shortlist:
+            matcher.set_seq1(texts[doc_id])
+            if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+                ratio = matcher.ratio()
+                if ratio >= cutoff:
+                    scored.append((ratio, texts[doc_id], -doc_id))
+        # Same ordering as get_close_matches: score, then title, descending
+        return [-neg_id for _, _, neg_id in heapq.nlargest(n, scored)]
+
+
+class JamoSpeller:
+    """
+    Corrects Hangul query words to the nearest word used in any title,
+    compared jamo by jamo: "리모켠" and "리모콘" are one letter from "리모컨"
+    but a whole syllable apart, which is too much for the title-level
+    fuzzy stage. Candidates come from jamo gram postings over the distinct
+    title words, so a lookup never compares against the whole vocabulary.
+    """
+
+    CUTOFF = 0.8
+    # Trailing particles also stripped from title words, so "연결이" offers
+    # "연결" as a correction too
+    PARTICLES = PARTICLES
+
+    def __init__(self):
+        self.word_ids: Dict[str, int] = {}
+        self.words: List[str] = []
+        self.counts = array('i')  # live titles using each word
+        self.grams = NgramIndex([])  # texts: decomposed words, None when unused
+        self.matcher = FuzzyMatcher(self.grams)
+
+    @classmethod
+    def _words(cls, title: str) -> set:
+        words = set()
+        for word in title.split():
+            if not any('가' <= ch <= '힣' for ch in word):
+                continue
+            words.add(word)
+            for particle in cls.PARTICLES:
+                if word.endswith(particle) and len(word) >= len(particle) + 2:
+                    words.add(word[:-len(particle)])
+                    break
+        return words
+
+    def copy(self) -> "JamoSpeller":
+        speller = copy.copy(self)
+        speller.word_ids = dict(self.word_ids)
+        speller.words = list(self.words)
+        speller.counts = self.counts[:]
+        speller.grams = self.grams.copy(list(self.grams.texts))
+        speller.matcher = FuzzyMatcher(speller.grams)
+        return speller
+
+    def add(self, title: str):
+        for word in self._words(title):
+            word_id = self.word_ids.get(word)
+            if word_id is None:
+                word_id = self.word_ids[word] = len(self.words)
+                self.words.append(word)
+                self.counts.append(0)
+                self.grams.texts.append(None)
+            if self.counts[word_id] == 0:
+                self.grams.texts[word_id] = decompose(word)
+                self.grams.add(word_id, self.grams.texts[word_id])
+            self.counts[word_id] += 1
+
+    def remove(self, title: str):
+        for word in self._words(title):
+            word_id = self.word_ids[word]
+            self.counts[word_id] -= 1
+            if self.counts[word_id] == 0:
+                self.grams.remove(word_id, self.grams.texts[word_id])
+                self.grams.texts[word_id] = None
+
+    def correct(self, word: str) -> str:
+        """
+        The nearest title word, or word itself if it is already one or
+        nothing is close enough.
+        """
+        word_id = self.word_ids.get(word)
+        if (word_id is not None and self.counts[word_id]) or not self._words(word):
+            return word
+        best = self.matcher.match(decompose(word), n=1, cutoff=self.CUTOFF)
+        return self.words[best[0]] if best else word
+
+
+class BM25Index:
+    """
+    BM25F-style full-text ranking over two fields, title and body.
+    Postings per term are three parallel arrays (doc ids, title tf, body tf);
+    body texts themselves are not kept.
+    """
+
+    K1 = 1.2
+    B = 0.75
+    TITLE_WEIGHT = 3.0
+    BODY_WEIGHT = 1.0
+
+    # Terms whose postings this copy no longer shares (see copy); None when
+    # it shares none
+    owned: Optional[set] = None
+
+    def __init__(self, parts: List[IndexPart]):
+        self.postings: Dict[str, Tuple[array, array, array]] = merge_postings([p.term_postings for p in parts])
+        self.title_lens = array('H')
+        self.body_lens = array('I')
+        for part in parts:
+            self.title_lens.extend(part.title_lens)
+            self.body_lens.extend(part.body_lens)
+        self.title_norm = array('f')
+        self.body_norm = array('f')
+        self.deleted = set()  # removed, still in the postings until compact()
+
+        self.doc_count = len(self.title_lens)
+        self.title_total = sum(self.title_lens)
+        self.body_total = sum(self.body_lens)
+        # Per-document length normalisation, precomputed for each field
+        for doc_id in range(self.doc_count):
+            self._append_norms(doc_id)
+
+    def _append_norms(self, doc_id: int):
+        b = self.B
+        live = self.doc_count or 1
+        avg_title = (self.title_total / live) or 1.0
+        avg_body = (self.body_total / live) or 1.0
+        self.title_norm.append(self.TITLE_WEIGHT / (1 - b + b * self.title_lens[doc_id] / avg_title))
+        self.body_norm.append(self.BODY_WEIGHT / (1 - b + b * self.body_lens[doc_id] / avg_body))
+
+    def refresh(self):
+        """
+        Settles a batch of add()/remove() calls: every document's norms are
+        recomputed from the current average lengths and removed documents
+        are dropped from the postings (compact), so scores are the ones a
+        fresh build of the same documents gives.
+        """
+        b = self.B
+        live = self.doc_count or 1
+        avg_title = (self.title_total / live) or 1.0
+        avg_body = (self.body_total / live) or 1.0
+        self.title_norm = array('f', [self.TITLE_WEIGHT / (1 - b + b * length / avg_title)
+                                      for length in self.title_lens])
+        self.body_norm = array('f', [self.BODY_WEIGHT / (1 - b + b * length / avg_body)
+                                     for length in self.body_lens])
+        self.compact()
+
+    def compact(self):
+        """
+        Removes the removed documents' entries from the postings (and terms
+        left without any), so they stop costing lookups and snapshot space.
+        """
+        deleted = self.deleted
+        if not deleted:
+            return
+        for term, posting in list(self.postings.items()):
+            if deleted.isdisjoint(posting[0]):
+                continue
+            keep = [i for i, doc_id in enumerate(posting[0]) if doc_id not in deleted]
+            if keep:
+                # New arrays, so nothing shared with the source index changes
+                self.postings[term] = tuple(array(column.typecode, [column[i] for i in keep]) for column in posting)
+                if self.owned is not None:
+                    self.owned.add(term)
+            else:
+                del self.postings[term]
+        self.deleted = set()
+
+    def copy(self) -> "BM25Index":
+        """
+        A copy that shares the posting arrays with this index until it
+        changes them; the per-document arrays are small and copied whole.
+        """
+        index = copy.copy(self)
+        index.postings = dict(self.postings)
+        index.owned = set()
+        index.title_lens = self.title_lens[:]
+        index.body_lens = self.body_lens[:]
+        index.title_norm = self.title_norm[:]
+        index.body_norm = self.body_norm[:]
+        index.deleted = set(self.deleted)
+        return index
+
+    def add(self, doc_id: int, title: str, body: str):
+        """
+        Appends a document; doc_id must be the next unused id. Norms use the
+        current average lengths, older documents keep theirs until refresh().
+        """
+        add_terms(self.postings, self.title_lens, self.body_lens, doc_id, title, body, self.owned)
+        self.doc_count += 1
+        self.title_total += self.title_lens[doc_id]
+        self.body_total += self.body_lens[doc_id]
+        self._append_norms(doc_id)
+
+    def remove(self, doc_id: int):
+        """
+        Tombstones a document. Its postings stay in place (the terms aren't
+        known without the old body), are skipped when ranking and left out
+        of document frequencies, until compact() drops them.
+        """
+        if doc_id in self.deleted:
+            return
+        self.deleted.add(doc_id)
+        self.doc_count -= 1
+        self.title_total -= self.title_lens[doc_id]
+        self.body_total -= self.body_lens[doc_id]
+
+    def candidates(self, query: str) -> int:
+        """
+        Number of documents sharing a term with the query, i.e. scored by
+        top_k before the min_match filter.
+        """
+        doc_ids = set()
+        for term in set(analyze(query)):
+            if term in self.postings:
+                doc_ids.update(self.postings[term][0])
+        return len(doc_ids - self.deleted)
+
+    def idf(self, df: int) -> float:
+        return math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+
+    def top_k(self, query: str, k: int = 10, min_match: float = 0.6) -> List[Tuple[int, float]]:
+        """
+        Best k (doc id, score) pairs for the query. A document must contain
+        at least min_match of the distinct query terms to be ranked.
+        """
+        query_terms = set(analyze(query))
+        terms = [term for term in query_terms if term in self.postings]
+        required = max(1, math.ceil(min_match * len(query_terms)))
+        if len(terms) < required:
+            return []
+
+        k1 = self.K1
+        title_norm = self.title_norm
+        body_norm = self.body_norm
+        deleted = self.deleted
+        scores: Dict[int, float] = {}
+        matched: Dict[int, int] = {}
+        for term in terms:
+            doc_ids, title_tfs, body_tfs = self.postings[term]
+            df = len(doc_ids)
+            if deleted:
+                # Same documents doc_count counts: live ones only
+                df -= len(deleted.intersection(doc_ids))
+            idf = self.idf(df)
+            for doc_id, title_tf, body_tf in zip(doc_ids, title_tfs, body_tfs):
+                tf = title_tf * title_norm[doc_id] + body_tf * body_norm[doc_id]
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf / (k1 + tf)
+                matched[doc_id] = matched.get(doc_id, 0) + 1
+
+        if required > 1 or deleted:
+            candidates = [doc_id for doc_id, count in matched.items()
+                          if count >= required and doc_id not in deleted]
+        else:
+            candidates = scores
+        # Ties broken by doc id so results are stable across rebuilds
+        return [(doc_id, scores[doc_id]) for doc_id in
+                heapq.nsmallest(k, candidates, key=lambda doc_id: (-scores[doc_id], doc_id))]
+
+
+class SearchIndex:
+    def __init__(self, titles: Iterable[str], bodies: Optional[List[str]] = None,
+                 parts: Optional[List[IndexPart]] = None, synonyms: Optional[SynonymTable] = None):
+        """
+        titles must already be lowercased (DocRecord.title_lower); they are
+        shared with the records rather than copied unless a synonym rewrites
+        them. bodies are the full document texts used for BM25; they are not
+        retained. Alternatively parts carries postings already built from
+        them with the same synonyms (see build_part).
+
+        Query methods take lowercased queries passed through canonical(),
+        except exact_match.
+        """
+        self.synonyms = synonyms if synonyms is not None else SynonymTable({})
+        self.titles: List[Optional[str]] = []        # canonical titles by doc id, None once removed
+        self.lower_titles: List[Optional[str]] = []  # the titles as given, likewise
+        # Title -> first doc id, as given and canonical: a post is found by
+        # its own title even when an alias makes it another post's too
+        self.exact: Dict[str, int] = {}
+        self.canonical_exact: Dict[str, int] = {}
+
+        for doc_id, lower_title in enumerate(titles):
+            title = self.synonyms.canonical(lower_title)
+            self.titles.append(title)
+            self.lower_titles.append(lower_title)
+            self.exact.setdefault(lower_title, doc_id)
+            self.canonical_exact.setdefault(title, doc_id)
+        if parts is None:
+            parts = [build_part(self.titles, bodies if bodies is not None else [""] * len(self.titles),
+                                synonyms=self.synonyms)]
+        self.title_grams = NgramIndex(self.titles, merge_postings([p.gram_postings for p in parts]))
+        # Initial-consonant forms ("ㄹㅁㅋㅅㅈ") for chosung queries
+        self.chosung_grams = NgramIndex([chosung(title) for title in self.titles],
+                                        merge_postings([p.chosung_postings for p in parts]))
+        self.fuzzy = FuzzyMatcher(self.title_grams)
+        self.speller = JamoSpeller()
+        for title in self.titles:
+            self.speller.add(title)
+        self.bm25 = BM25Index(parts)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def canonical(self, query: str) -> str:
+        """
+        The lowercased query with aliases rewritten, as the titles were.
+        """
+        return self.synonyms.canonical(query)
+
+    def copy(self) -> "SearchIndex":
+        """
+        A copy to apply add()/remove() to while this one keeps serving.
+        Containers are copied; posting arrays are shared and each is copied
+        only when the copy first changes it, so the cost follows the size
+        of the change rather than of the index.
+        """
+        index = copy.copy(self)
+        index.titles = list(self.titles)
+        index.lower_titles = list(self.lower_titles)
+        index.exact = dict(self.exact)
+        index.canonical_exact = dict(self.canonical_exact)
+        index.title_grams = self.title_grams.copy(index.titles)
+        index.chosung_grams = self.chosung_grams.copy(list(self.chosung_grams.texts))
+        index.fuzzy = FuzzyMatcher(index.title_grams)
+        index.speller = self.speller.copy()
+        index.bm25 = self.bm25.copy()
+        return index
+
+    def add(self, title: str, body: str) -> int:
+        """
+        Indexes one more document and returns its doc id (always the next
+        free id, so existing ids and posting order are unchanged).
+        """
+        lower_title, title = title, self.synonyms.canonical(title)
+        body = self.synonyms.canonical(body.lower())
+        doc_id = len(self.titles)
+        self.titles.append(title)
+        self.lower_titles.append(lower_title)
+        self.exact.setdefault(lower_title, doc_id)
+        self.canonical_exact.setdefault(title, doc_id)
+        self.title_grams.add(doc_id, title)
+        self.chosung_grams.texts.append(chosung(title))
+        self.chosung_grams.add(doc_id, self.chosung_grams.texts[doc_id])
+        self.speller.add(title)
+        self.bm25.add(doc_id, title, body)
+        return doc_id
+
+    def remove(self, doc_id: int):
+        title = self.titles[doc_id]
+        if title is None:
+            return
+        lower_title = self.lower_titles[doc_id]
+        self.titles[doc_id] = None
+        self.lower_titles[doc_id] = None
+        self.title_grams.remove(doc_id, title)
+        self.chosung_grams.remove(doc_id, self.chosung_grams.texts[doc_id])
+        self.chosung_grams.texts[doc_id] = None
+        self.speller.remove(title)
+        self.bm25.remove(doc_id)
+        self._release_exact(self.exact, self.lower_titles, lower_title, title, doc_id)
+        self._release_exact(self.canonical_exact, self.titles, title, title, doc_id)
+
+    def _release_exact(self, exact: Dict[str, int], titles: List[Optional[str]], key: str, title: str,
+                       doc_id: int):
+        # Hands a removed document's exact-title slot to the next document
+        # with that key (which shares its canonical title)
+        if exact.get(key) != doc_id:
+            return
+        del exact[key]
+        for other in sorted(self.title_grams.search(title)):
+            if titles[other] == key:
+                exact[key] = other
+                break
+
+    def candidates_examined(self, stage: str, query) -> int:
+        """
+        How many documents a stage looks at for its argument (the query,
+        or the token list for "token"). Recomputes the stage's candidate
+        generation, so it is meant for explain mode, not the hot path.
+        """
+        if stage == "exact":
+            return 1
+        if stage == "substring":
+            return self._gram_candidates(self.title_grams, query)
+        if stage == "chosung":
+            return self._gram_candidates(self.chosung_grams, chosung(query)) if is_chosung_query(query) else 0
+        if stage == "token":
+            return sum(self._gram_candidates(self.title_grams, token) for token in set(query))
+        if stage == "respelled":
+            return sum(self.speller.matcher.candidates(decompose(word)) for word in query.split()
+                       if self.speller.correct(word) != word)
+        if stage == "fulltext":
+            return self.bm25.candidates(query)
+        if stage == "fuzzy":
+            return self.fuzzy.candidates(query)
+        raise ValueError(f"unknown search stage {stage!r}")
+
+    @staticmethod
+    def _gram_candidates(grams: NgramIndex, query: str) -> int:
+        candidates = grams.candidates(query)
+        if candidates is None:
+            # Too short for grams: every live text is scanned
+            return sum(text is not None for text in grams.texts)
+        return len(candidates)
+
+    def exact_match(self, query: str) -> Optional[int]:
+        """
+        Returns the first doc id whose title equals the lowercased query
+        (not passed through canonical()), else the first whose canonical
+        title equals the canonical query.
+        """
+        doc_id = self.exact.get(query)
+        if doc_id is None:
+            doc_id = self.canonical_exact.get(self.canonical(query))
+        return doc_id
+
+    def substring_hits(self, query: str) -> set:
+        """
+        Doc ids whose title contains the whole query.
+        """
+        if not query:
+            return set()
+        return self.title_grams.search(query)
+
+    def chosung_hits(self, query: str) -> set:
+        """
+        Doc ids whose initial consonants contain the query's ("ㄹㅁㅋ" or
+        "ㄹㅁㅋ 설정" finds "리모컨 설정"). Empty unless the query has a bare
+        initial consonant.
+        """
+        if not is_chosung_query(query):
+            return set()
+        return self.chosung_grams.search(chosung(query))
+
+    def chosung_match(self, query: str) -> List[int]:
+        """
+        chosung_hits in doc id order.
+        """
+        return sorted(self.chosung_hits(query))
+
+    def respelled_match(self, query: str) -> List[int]:
+        """
+        Doc ids whose title contains the query once its misspelled words are
+        replaced by the nearest title words (see JamoSpeller), in doc id
+        order. Empty if no word needed correcting.
+        """
+        tokens = query.split()
+        corrected = [self.speller.correct(token) for token in tokens]
+        if corrected == tokens:
+            return []
+        return self.token_match(corrected)
+
+    def fuzzy_match(self, query: str, n: int = 5) -> List[int]:
+        """
+        Doc ids of the closest titles for typo tolerance, best first.
+        """
+        return self.fuzzy.match(query, n=n)
+
+    def fulltext_match(self, query: str, k: int = 10) -> List[int]:
+        """
+        Doc ids of the k best BM25 matches over title and body, best first.
+        """
+        return [doc_id for doc_id, _ in self.bm25.top_k(query, k=k)]
+
+    def token_hits(self, tokens: List[str]) -> set:
+        """
+        Doc ids whose title contains every token (AND logic).
+        """
+        # Start from the rarest token so the running set stays small
+        matches = sorted((self.title_grams.search(token) for token in set(tokens)), key=len)
+        result = matches[0]
+        for docs in matches[1:]:
+            if not result:
+                break
+            result = result & docs
+        return result
+
+    def token_match(self, tokens: List[str]) -> List[int]:
+        """
+        token_hits in doc id order.
+        """
+        return sorted(self.token_hits(tokens))
@@ -0,0 +1,91 @@
+import difflib
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from search_index import SearchIndex
+
+# --- Search Trace ---
+# Explain mode for ContentIndexer.search_top_k: what every stage of the
+# cascade examined, found and cost, and why each result ranked where it did.
+
+# How each stage orders the hits it contributes
+STAGE_ORDER = {
+    "exact": "exact title",
+    "substring": "doc id",
+    "chosung": "doc id",
+    "token": "doc id",
+    "respelled": "doc id",
+    "fulltext": "BM25 score",
+    "fuzzy": "similarity",
+}
+
+
+def run_stage(stage: str, fn: Callable, *args):
+    """
+    Stage runner used when not explaining: just the call.
+    """
+    return fn(*args)
+
+
+class SearchTrace:
+    def __init__(self, engine: SearchIndex, query: str):
+        self.engine = engine
+        self.query = query  # canonical form, as the stages see it
+        self.stages: List[Dict[str, Any]] = []
+        self.first_stage: Dict[int, str] = {}
+        self.page: List[int] = []  # doc ids of the returned results
+
+    def run(self, stage: str, fn: Callable, *args):
+        """
+        Stage runner for explain mode: times the call, then counts what the
+        stage examined (outside the timed part).
+        """
+        started = time.perf_counter_ns()
+        result = fn(*args)
+        elapsed_us = (time.perf_counter_ns() - started) / 1000
+        if result is None:
+            hits = []
+        elif isinstance(result, int):
+            hits = [result]
+        else:
+            hits = result
+        for doc_id in hits:
+            self.first_stage.setdefault(doc_id, stage)
+        self.stages.append({
+            "stage": stage,
+            "examined": self.engine.candidates_examined(stage, args[0]),
+            "hits": len(hits),
+            "elapsed_us": round(elapsed_us, 1),
+        })
+        return result
+
+    def reason(self, doc_id: int) -> Dict[str, Any]:
+        """
+        Which stage put doc_id in the results, and the value it was ordered by.
+        """
+        stage = self.first_stage.get(doc_id)
+        reason = {"stage": stage, "ordered_by": STAGE_ORDER.get(stage)}
+        title = self.engine.titles[doc_id]
+        if stage == "respelled":
+            reason["corrected_query"] = " ".join(self.engine.speller.correct(word) for word in self.query.split())
+        elif stage == "fulltext":
+            scores = dict(self.engine.bm25.top_k(self.query, k=5))
+            reason["score"] = round(scores.get(doc_id, 0.0), 4)
+        elif stage == "fuzzy" and title is not None:
+            reason["similarity"] = round(difflib.SequenceMatcher(None, self.query, title).ratio(), 4)
+        return reason
+
+    def report(self, items: List[Any], total: int, offset: int = 0,
+               generation: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "query": self.query,
+            "generation": generation,
+            "total": total,
+            "stages_elapsed_us": round(sum(stage["elapsed_us"] for stage in self.stages), 1),
+            "stages": self.stages,
+            "results": [
+                {"rank": rank, "doc_id": doc_id, "title": item.title, "category": item.category,
+                 **self.reason(doc_id)}
+                for rank, (item, doc_id) in enumerate(zip(items, self.page), offset + 1)
+            ],
+        }
@@ -1,18 +1,35 @@
 import os
+import argparse
+import hashlib
+import heapq
+import itertools
+import secrets
+import threading
+import unicodedata
 import urllib.parse
-import re
-import difflib
-import html
-from typing import Optional, Dict, Any, List
+from array import array
+from typing import Callable, Optional, Dict, Any, List, NamedTuple, Sequence
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import ValidationError
 import uvicorn
 import asyncio
 import httpx
 
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, Response
+from search_index import SearchIndex
+from search_trace import SearchTrace, run_stage
+from doc_store import DocRecord, FileState, file_digest, file_identity, scan_posts
+from index_build import IndexGeneration, build_index, category_buckets, layout_digest, read_post
+from content_watcher import ContentWatcher
+from response_cache import ResponseCache
+from intent_table import Intent, IntentTable, load_intents
+from json_response import SkillJSONResponse, dumps
+from kakao_request import KakaoRequest, read_body
+from synonyms import SynonymTable, load_synonyms
+from index_snapshot import content_fingerprint, read_snapshot, write_snapshot
+from index_mmap import read_mapped_index, write_mapped_index
 app = FastAPI()
 
 app.add_middleware(
@@ -50,188 +67,383 @@ HOST_BASE_URL = f"{RENDER_EXTERNAL_URL}"
 if not HOST_BASE_URL.startswith("http"):
     HOST_BASE_URL = f"https://{HOST_BASE_URL}"
 
-# --- Data Models ---
-
-class UserRequest(BaseModel):
-    timezone: str
-    params: Dict[str, str]
-    block: Dict[str, str]
-    utterance: str
-    lang: Optional[str] = None
-    user: Optional[Dict[str, Any]] = None
-
-class Action(BaseModel):
-    name: str
-    clientExtra: Optional[Dict[str, Any]] = None
-    params: Dict[str, str]
-    id: str
-    detailParams: Dict[str, Any]
-
-class KakaoRequest(BaseModel):
-    intent: Dict[str, Any]
-    userRequest: UserRequest
-    bot: Dict[str, Any]
-    action: Action
-    contexts: List[Any]
+DocRecord.host_base_url = HOST_BASE_URL
+
+# Prebuilt index (see `python skill_server.py --build-snapshot`)
+SNAPSHOT_PATH = os.getenv("INDEX_SNAPSHOT_PATH", os.path.join(CURRENT_DIR, "index_snapshot.bin"))
+
+# Shared read-only index for `--workers N` (see `python skill_server.py
+# --build-mapped-index`); unset to keep a private index per process
+MAPPED_INDEX_PATH = os.getenv("INDEX_MAPPED_PATH")
+
+# Fallback keyword intents and their responses (see intent_table.py),
+# reloaded when the file changes
+INTENTS_PATH = os.getenv("INTENTS_PATH", os.path.join(CURRENT_DIR, "intents.json"))
+
+# Alias spellings indexed and searched as one term (see synonyms.py)
+SYNONYMS_PATH = os.getenv("SYNONYMS_PATH", os.path.join(CURRENT_DIR, "synonyms.json"))
+
+# Worker processes for a full index build (1 = build in-process)
+INDEX_BUILD_WORKERS = int(os.getenv("INDEX_BUILD_WORKERS", "1"))
+
+# Hot reload: reindex changed posts while serving (CONTENT_WATCH=0 to disable)
+CONTENT_WATCH = os.getenv("CONTENT_WATCH", "1") != "0"
+CONTENT_WATCH_DEBOUNCE = float(os.getenv("CONTENT_WATCH_DEBOUNCE", "2"))
+CONTENT_WATCH_POLL_INTERVAL = float(os.getenv("CONTENT_WATCH_POLL_INTERVAL", "10"))
+
+# /api/fallback response cache (entries, seconds); size 0 disables it
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+
+# Larger /api/fallback bodies are refused before parsing (OpenBuilder
+# payloads are a few KB)
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", "65536"))
+
+# "더 보여줘" pages carry their paging state in a Kakao context of this
+# name; with PAGING_BLOCK_ID (the fallback block's id) the "더 보기" button
+# is a block button and also sends it as clientExtra
+PAGING_CONTEXT = "paging"
+PAGING_BLOCK_ID = os.getenv("PAGING_BLOCK_ID")
+
+# "더 보여줘" paging cursors: users kept and idle seconds before one expires
+CURSOR_STORE_SIZE = int(os.getenv("CURSOR_STORE_SIZE", "1000"))
+CURSOR_TTL = float(os.getenv("CURSOR_TTL", "600"))
+
+# /debug/search only exists when this is set, and needs it as ?token=
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN")
+DEBUG_MAX_K = 50
 
 # --- Content Indexer ---
 
+class SearchPage(NamedTuple):
+    items: List[DocRecord]
+    total: int  # distinct titles matched, not just the ones in items
+    explain: Optional[Dict[str, Any]] = None  # see SearchTrace.report
+    doc_ids: Sequence[int] = ()  # of items
+
+def heap_in_order(doc_ids):
+    """
+    Yields doc ids smallest first, paying for a full sort only if the
+    caller reads them all.
+    """
+    heap = list(doc_ids)
+    heapq.heapify(heap)
+    while heap:
+        yield heapq.heappop(heap)
+
 class ContentIndexer:
-    def __init__(self, base_dir):
+    def __init__(self, base_dir, snapshot_path=None, workers=1, synonyms=None, mapped_path=None):
         self.base_dir = base_dir
-        self.index = []
-        self.reload_index()
-
-    def extract_summary(self, file_path):
+        self.snapshot_path = snapshot_path
+        # Processes used for full rebuilds (see index_build.build_index)
+        self.workers = workers
+        self.synonyms = synonyms if synonyms is not None else SynonymTable({})
+        # The published index. Rebuilds work on a copy and replace it in one
+        # assignment, so requests read it without locking
+        self.current = IndexGeneration(0, [], SearchIndex([], [], synonyms=self.synonyms), {}, None,
+                                       category_buckets([]), layout_digest([]))
+        # Serializes rebuilds (startup, content watcher); readers never take it
+        self.build_lock = threading.Lock()
+        # Set while serving from a mapped index file: read-only, replaced
+        # as a whole when the file is (see reload_mapped)
+        self.mapped_path = None
+        self.mapped_identity = None
+        # Called with each new generation, from whichever thread published it
+        self.on_publish: Optional[Callable[[IndexGeneration], None]] = None
+        if not (mapped_path and self.load_mapped(mapped_path)):
+            self.load_private()
+
+    def load_private(self):
         """
-        Extracts a brief summary from the HTML file.
-        It reads the file, strips HTML tags, and returns the first 800 chars.
+        Loads or builds an index owned by this process.
         """
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                # Remove style and script tags first
-                content = re.sub(r'<style.*?>.*?</style>', '', content, flags=re.DOTALL)
-                content = re.sub(r'<script.*?>.*?</script>', '', content, flags=re.DOTALL)
-                
-                # Remove meta-info div specifically (contains Original Post link)
-                content = re.sub(r'<div class="meta-info">.*?</div>', '', content, flags=re.DOTALL)
-
-                # Remove tables to avoid messy text
-                content = re.sub(r'<table.*?>.*?</table>', '', content, flags=re.DOTALL)
-                
-                # Simple regex to strip HTML tags
-                text = re.sub('<[^<]+?>', ' ', content)
-                # Unescape HTML entities (e.g., &#x27; -> ')
-                text = html.unescape(text)
-                # Remove extra whitespace
-                text = ' '.join(text.split())
-                
-                # Truncate
-                max_len = 800
-                if len(text) > max_len:
-                    # Try to find the last period before max_len
-                    last_period = text.rfind('.', 0, max_len)
-                    if last_period != -1:
-                        return text[:last_period+1]
-                    return text[:max_len] + "..."
-                return text
-            return text
-        except Exception as e:
-            print(f"Error reading {file_path}: {e}")
-            return "내용을 미리볼 수 없습니다."
-
-    def extract_image(self, file_path):
+        self.mapped_path = self.mapped_identity = None
+        if not (self.snapshot_path and self.load_snapshot(self.snapshot_path)):
+            self.reload_index()
+
+    @property
+    def index(self):
+        return self.current.records
+
+    @property
+    def engine(self):
+        return self.current.engine
+
+    def _publish(self, records, engine, file_state, fingerprint, categories=None, layout=None):
+        if categories is None:
+            categories = category_buckets(records)
+        if layout is None:
+            layout = layout_digest(records)
+        self.current = IndexGeneration(self.current.number + 1, records, engine, file_state, fingerprint,
+                                       categories, layout)
+        if self.on_publish is not None:
+            self.on_publish(self.current)
+
+    def load_mapped(self, mapped_path):
         """
-        Extracts the first image src from the HTML file.
+        Serves from the shared index file written by save_mapped. Returns
+        False (and leaves the index untouched) if it is missing, unusable
+        or older than the content.
         """
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                # Find first img tag
-                match = re.search(r'<img[^>]+src=["\']([^"\']+)["\']', content)
-                if match:
-                    return match.group(1)
-            return None
-        except Exception:
-            return None
-
-    def reload_index(self):
-        self.index = []
         if not os.path.exists(self.base_dir):
-            print(f"Warning: Base directory {self.base_dir} does not exist.")
+            return False
+        identity = file_identity(mapped_path)
+        loaded = read_mapped_index(mapped_path, self.base_dir, self.synonyms)
+        if loaded is None:
+            return False
+        if loaded.fingerprint != content_fingerprint(scan_posts(self.base_dir)):
+            print(f"Ignoring mapped index {mapped_path}: content changed since it was written.")
+            return False
+        with self.build_lock:
+            self._publish(loaded.records, loaded.engine, {}, loaded.fingerprint, loaded.categories, loaded.layout)
+            self.mapped_path = mapped_path
+            self.mapped_identity = identity
+        print(f"Mapped {len(loaded.records)} documents from {mapped_path}.")
+        return True
+
+    def reload_mapped(self):
+        """
+        Remaps the index file once it has been replaced. Content changes
+        reach mapped workers this way only: the process that writes the
+        file (`--build-mapped-index --watch`) does the reindexing.
+        """
+        if self.mapped_path is None or file_identity(self.mapped_path) == self.mapped_identity:
             return
+        if not self.load_mapped(self.mapped_path):
+            print(f"Keeping the current mapped index until {self.mapped_path} is usable.")
 
-        categories = {
-            "QnA": "크롤링_QnA",
-            "Selftest": "크롤링_selftest_MD",
-            "Products": "크롤링_Products"
-        }
+    def save_mapped(self, mapped_path):
+        generation = self.current
+        write_mapped_index(mapped_path, generation.fingerprint, generation.records, generation.engine)
+        print(f"Wrote mapped index with {len(generation.file_state)} documents to {mapped_path}.")
 
-        for category_name, folder_name in categories.items():
-            cat_path = os.path.join(self.base_dir, folder_name)
-            if not os.path.exists(cat_path):
-                continue
-            
-            for post_title in os.listdir(cat_path):
-                post_dir = os.path.join(cat_path, post_title)
-                index_file = os.path.join(post_dir, "index.html")
-                
-                if os.path.isdir(post_dir) and os.path.exists(index_file):
-                    # Construct a relative web path
-                    safe_folder = urllib.parse.quote(folder_name)
-                    safe_title = urllib.parse.quote(post_title)
-                    web_path = f"/{safe_folder}/{safe_title}/index.html"
-                    
-                    summary = self.extract_summary(index_file)
-                    image_src = self.extract_image(index_file)
-                    
-                    # Construct full image URL if image exists
-                    image_url = None
-                    if image_src:
-                        # Handle relative paths
-                        if not image_src.startswith("http"):
-                             image_url = f"{HOST_BASE_URL}/{safe_folder}/{safe_title}/{image_src}"
-                        else:
-                             image_url = image_src
-
-                    self.index.append({
-                        "title": post_title,
-                        "category": category_name,
-                        "path": web_path,
-                        "full_path": index_file,
-                        "summary": summary,
-                        "image_url": image_url,
-                        "link": HOST_BASE_URL + web_path
-                    })
-        print(f"Indexed {len(self.index)} documents.")
+    def load_snapshot(self, snapshot_path):
+        """
+        Loads the prebuilt index, then catches up with any content changed
+        since it was built. Returns False (and leaves the index untouched)
+        if there is no usable snapshot.
+        """
+        if not os.path.exists(self.base_dir):
+            return False
+        loaded = read_snapshot(snapshot_path)
+        if loaded is None:
+            return False
+        fingerprint, (records, engine, file_state) = loaded
+        if engine.synonyms.digest != self.synonyms.digest:
+            print(f"Ignoring index snapshot {snapshot_path}: built with different synonyms.")
+            return False
+        for record in records:
+            if record is not None:
+                record.base_dir = self.base_dir
+        with self.build_lock:
+            self._publish(records, engine, file_state, fingerprint)
+        print(f"Loaded {len(file_state)} documents from {snapshot_path}.")
+        self.update_index()
+        return True
+
+    def save_snapshot(self, snapshot_path):
+        generation = self.current
+        write_snapshot(snapshot_path, generation.fingerprint or "",
+                       (generation.records, generation.engine, generation.file_state))
+        print(f"Wrote index snapshot with {len(generation.file_state)} documents to {snapshot_path}.")
+
+    def reload_index(self):
+        with self.build_lock:
+            if not os.path.exists(self.base_dir):
+                print(f"Warning: Base directory {self.base_dir} does not exist.")
+                self._publish([], SearchIndex([], [], synonyms=self.synonyms), {}, None)
+                return
+
+            # Scanned before reading so edits made during the build make it stale
+            posts = scan_posts(self.base_dir)
+            fingerprint = content_fingerprint(posts)
+            records, engine, file_state = build_index(self.base_dir, posts, workers=self.workers,
+                                                      synonyms=self.synonyms)
+            self._publish(records, engine, file_state, fingerprint)
+            print(f"Indexed {len(records)} documents.")
+
+    def update_index(self):
+        """
+        Incremental reload: re-extracts only posts whose index.html was
+        added or changed (by size/mtime, then content hash) and drops
+        removed ones. The changes are applied to a copy of the current
+        generation, which is then published in place of it.
+        Returns (added, changed, removed) counts.
+        """
+        if not os.path.exists(self.base_dir) or self.mapped_path is not None:
+            return 0, 0, 0
+        with self.build_lock:
+            generation = self.current
+            posts = scan_posts(self.base_dir)
+            fingerprint = content_fingerprint(posts)
+            if fingerprint == generation.fingerprint:
+                return 0, 0, 0
+
+            file_state = dict(generation.file_state)
+            removed_keys = [key for key in file_state if key not in posts]
+            edited = []
+            for key, (index_file, size, mtime_ns) in posts.items():
+                state = file_state.get(key)
+                if state and state.size == size and state.mtime_ns == mtime_ns:
+                    continue
+                try:
+                    digest = file_digest(index_file)
+                except OSError:
+                    continue  # removed mid-scan, picked up next time
+                if state and state.digest == digest:
+                    # Touched but not edited (e.g. a fresh checkout)
+                    file_state[key] = state._replace(mtime_ns=mtime_ns)
+                    continue
+                edited.append((key, index_file, size, mtime_ns, digest))
+
+            if not (removed_keys or edited):
+                # Same documents: no new generation for readers to pick up
+                self.current = generation._replace(file_state=file_state, fingerprint=fingerprint)
+                return 0, 0, 0
+
+            # Copy-on-write: only the postings the changes touch are copied
+            engine = generation.engine.copy()
+            records = list(generation.records)
+            added = changed = 0
+            for key in removed_keys:
+                self._remove_doc(engine, records, file_state.pop(key).doc_id)
+            for key, index_file, size, mtime_ns, digest in edited:
+                state = file_state.get(key)
+                if state:
+                    self._remove_doc(engine, records, state.doc_id)
+                    changed += 1
+                else:
+                    added += 1
+                category_name, post_title = key
+                record, text, _ = read_post(self.base_dir, category_name, post_title, index_file)
+                doc_id = engine.add(record.title_lower, text)
+                records.append(record)
+                file_state[key] = FileState(doc_id, size, mtime_ns, digest)
+            # Norms and document frequencies as a full rebuild would have them
+            engine.bm25.refresh()
+
+            self._publish(records, engine, file_state, fingerprint)
+        removed = len(removed_keys)
+        print(f"Reindexed: {added} added, {changed} changed, {removed} removed.")
+        return added, changed, removed
+
+    @staticmethod
+    def _remove_doc(engine, records, doc_id):
+        engine.remove(doc_id)
+        records[doc_id] = None
 
     def search(self, query: str) -> List[Dict]:
+        return self.search_top_k(query, k=None).items
+
+    def search_top_k(self, query: str, k: Optional[int] = 5, offset: int = 0,
+                     explain: bool = False, generation: Optional[IndexGeneration] = None) -> SearchPage:
+        """
+        Results offset .. offset+k-1 of the full search (all from offset on
+        if k is None), and how many distinct titles matched in total.
+        Stages 2-3 only yield hit sets: those are counted, and a heap pops
+        just enough of them in doc id order to fill the page.
+        With explain, the page also carries per-stage candidates, hits and
+        timings and the reason for each result (see SearchTrace).
+        generation defaults to the current one; doc ids are only valid
+        in the generation searched.
+        """
         if not query:
-            return []
-        
-        query = query.lower().strip()
-        results = []
-        seen_titles = set()
+            return SearchPage([], 0)
+
+        # One generation for the whole search, even if a reload lands meanwhile
+        if generation is None:
+            generation = self.current
+        records, engine = generation.records, generation.engine
+        # Aliases rewritten in the same single pass the titles went through,
+        # after the exact stage has looked for the title as typed
+        lower_query = query.lower().strip()
+        query = engine.canonical(lower_query)
+        end = None if k is None else offset + k
+        trace = SearchTrace(engine, query) if explain else None
+        stage = trace.run if trace is not None else run_stage
+
+        def finish(page, page_ids, total):
+            if trace is None:
+                return SearchPage(page, total, None, page_ids)
+            trace.page = page_ids
+            return SearchPage(page, total, trace.report(page, total, offset, generation.number), page_ids)
 
-        def add_result(item):
-            if item['title'] not in seen_titles:
-                results.append(item)
-                seen_titles.add(item['title'])
-        
         # 1. Exact Title Match (Priority)
-        for item in self.index:
-            if query == item['title'].lower():
-                add_result(item)
-                return results # Return immediately if exact match found
-
-        # 2. Exact Substring Match
-        for item in self.index:
-            if query in item['title'].lower():
-                add_result(item)
-        
+        doc_id = stage("exact", engine.exact_match, lower_query)
+        if doc_id is not None:
+            return finish([records[doc_id]][offset:end], [doc_id][offset:end], 1) # Return immediately if exact match found
+
+        # 2. Exact Substring Match, 2-1. Initial Consonant Match ("ㄹㅁㅋ" -> 리모컨),
         # 3. Token Match (AND logic)
         tokens = query.split()
+        stages = [stage("substring", engine.substring_hits, query), stage("chosung", engine.chosung_hits, query)]
         if len(tokens) > 1:
-            for item in self.index:
-                if all(token in item['title'].lower() for token in tokens):
-                    add_result(item)
-
-        # 4. Fuzzy Match (difflib)
-        if len(results) < 3:
-            titles = [item['title'] for item in self.index]
-            matches = difflib.get_close_matches(query, titles, n=5, cutoff=0.4)
-            for match in matches:
-                for item in self.index:
-                    if item['title'] == match:
-                        add_result(item)
-        
-        return results
+            stages.append(stage("token", engine.token_hits, tokens))
+        titles = {records[doc_id].title for hits in stages for doc_id in hits}
+
+        # The remaining stages only run while there are fewer than 3 results
+        # and return a handful each, so they are kept in full
+        tail = []
+        def add_stage(doc_ids):
+            for doc_id in doc_ids:
+                tail.append(doc_id)
+                titles.add(records[doc_id].title)
+
+        # 3-1. Jamo Typo Correction ("리모켠" -> 리모컨)
+        if len(titles) < 3:
+            add_stage(stage("respelled", engine.respelled_match, query))
+
+        # 4. Full-text Match (BM25 over title + body)
+        if len(titles) < 3:
+            add_stage(stage("fulltext", engine.fulltext_match, query, 5))
+
+        # 5. Fuzzy Match (prebuilt gram shortlist + difflib ratio)
+        if len(titles) < 3:
+            add_stage(stage("fuzzy", engine.fuzzy_match, query, 5))
+
+        page = []
+        page_ids = []
+        seen_titles = set()
+        ordered = itertools.chain(*(heap_in_order(hits) for hits in stages), tail)
+        for doc_id in ordered:
+            item = records[doc_id]
+            if item.title in seen_titles:
+                continue
+            seen_titles.add(item.title)
+            if len(seen_titles) > offset:
+                page.append(item)
+                page_ids.append(doc_id)
+                if end is not None and len(seen_titles) >= end:
+                    break
+        return finish(page, page_ids, len(titles))
+
+    def search_fulltext(self, query: str, k: int = 10) -> List[Dict]:
+        """
+        BM25 ranking over titles and full document bodies, best first.
+        """
+        generation = self.current
+        query = generation.engine.canonical(query.lower().strip())
+        if not query:
+            return []
+        return [generation.records[doc_id] for doc_id in generation.engine.fulltext_match(query, k=k)]
 
     def get_by_category(self, category: str) -> List[Dict]:
-        return [item for item in self.index if item['category'] == category]
-
-indexer = ContentIndexer(BASE_DIR)
+        """
+        Documents in the category, sorted by title. Shared with the index:
+        don't modify the returned list.
+        """
+        return self.current.categories.get(category, [])
+
+indexer = ContentIndexer(BASE_DIR, snapshot_path=SNAPSHOT_PATH, workers=INDEX_BUILD_WORKERS,
+                         synonyms=load_synonyms(SYNONYMS_PATH), mapped_path=MAPPED_INDEX_PATH)
+if indexer.mapped_path is not None:
+    # Mapped workers only follow the file; its writer follows the posts
+    content_watcher = ContentWatcher(indexer.mapped_path, indexer.reload_mapped,
+                                     debounce=CONTENT_WATCH_DEBOUNCE, poll_interval=CONTENT_WATCH_POLL_INTERVAL,
+                                     fingerprint=lambda: file_identity(MAPPED_INDEX_PATH))
+else:
+    content_watcher = ContentWatcher(BASE_DIR, indexer.update_index, debounce=CONTENT_WATCH_DEBOUNCE,
+                                     poll_interval=CONTENT_WATCH_POLL_INTERVAL)
 
 # --- Response Helpers ---
 
@@ -245,10 +457,14 @@ def simple_text(text: str):
         "simpleText": {"text": text}
     }
 
-def list_card(title: str, items: List[Dict]):
+def list_card(title: str, items: List[Dict], total: Optional[int] = None,
+              more_message: Optional[str] = None, more_extra: Optional[Dict[str, Any]] = None):
     """
     Creates a Kakao ListCard.
     items should be a list of dicts with 'title', 'description', 'link'.
+    total is the number of results in all when items is only the first page.
+    more_message is what "더 보기" sends (default: "{title} 더 보여줘"); with
+    PAGING_BLOCK_ID set, more_extra comes back as the request's clientExtra.
     """
     kakao_items = []
     for item in items[:5]: # ListCard supports max 5 items
@@ -266,13 +482,16 @@ def list_card(title: str, items: List[Dict]):
         "items": kakao_items
     }
     
-    if len(items) > 5:
+    if (len(items) if total is None else total) > 5:
+        more_button = {
+            "label": "더 보기 ➕",
+            "action": "message",
+            "messageText": more_message or f"{title} 더 보여줘"
+        }
+        if more_extra is not None and PAGING_BLOCK_ID:
+            more_button.update({"action": "block", "blockId": PAGING_BLOCK_ID, "extra": more_extra})
         card["buttons"] = [
-            {
-                "label": "더 보기 ➕",
-                "action": "message",
-                "messageText": f"{title} 더 보여줘"
-            },
+            more_button,
             {
                 "label": "🌐 전체보기",
                 "action": "webLink",
@@ -363,6 +582,87 @@ def basic_card(item: Dict):
         }
     }
 
+# --- Category Menus ---
+
+# category -> (list card title, intro text)
+CATEGORY_MENUS = {
+    "Selftest": ("자가 진단", "🛠️ 자가 진단 리스트입니다.\n원하시는 항목을 선택해주세요."),
+    "QnA": ("자주 묻는 질문", "❓ 자주 묻는 질문 리스트입니다.\n원하시는 항목을 선택해주세요."),
+    "Products": ("이스트라 제품", "이스트라의 주요 제품 리스트입니다.\n원하시는 항목을 선택해주세요."),
+}
+
+# What a "더 보여줘" for a category menu's list card names it by: its
+# title, or the category itself
+MENU_CATEGORIES = {
+    **{category: category for category in CATEGORY_MENUS},
+    **{title: category for category, (title, _) in CATEGORY_MENUS.items()},
+}
+
+class GenerationCache:
+    """
+    Responses that depend only on the content index: each is built once
+    and kept until a new index generation is published.
+    """
+    def __init__(self):
+        self.generation = None
+        self.entries = {}
+
+    def get(self, key, build):
+        generation = indexer.current
+        if generation.number != self.generation:
+            self.entries = {}
+            self.generation = generation.number
+        response = self.entries.get(key)
+        if response is None:
+            response = self.entries[key] = build(generation)
+        return response
+
+category_cards = GenerationCache()
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+def more_results_response(query: str, title_prefix: str, next_items: List[Dict], start: int = 5,
+                          total: Optional[int] = None, more_message: Optional[str] = None,
+                          paging: Optional[Dict[str, str]] = None):
+    # next_items: results start+1 to start+len(next_items); with total (all
+    # results), the card offers the page after them as more_message, and
+    # paging (see paging_params) travels with it
+    if next_items:
+        has_more = total is not None and total > start + len(next_items)
+        response = {
+            "version": "2.0",
+            "template": {
+                "outputs": [
+                    simple_text(f"{title_prefix} 더 보기 ({start+1}~{start+len(next_items)}위)"),
+                    list_card(f"{query} 더 보기", next_items, None if total is None else total - start, more_message,
+                              {PAGING_CONTEXT: paging} if has_more and paging else None)
+                ]
+            }
+        }
+        if has_more and paging:
+            response["context"] = {"values": [{"name": PAGING_CONTEXT, "lifeSpan": 1, "params": paging}]}
+        return response
+    else:
+         return {
+            "version": "2.0",
+            "template": {
+                "outputs": [
+                    simple_text("🚫 더 이상 보여줄 내용이 없습니다.")
+                ]
+            }
+        }
+
+def category_menu_response(category: str):
+    title, intro = CATEGORY_MENUS[category]
+    return category_cards.get(category, lambda generation: {
+        "version": "2.0",
+        "template": {
+            "outputs": [
+                simple_text(intro),
+                list_card(title, generation.categories[category])
+            ]
+        }
+    })
+
 # --- Endpoints ---
 
 def get_welcome_response():
@@ -425,422 +725,470 @@ def get_welcome_response():
         }
     }
 
+def normalize_utterance(utterance: str) -> str:
+    """
+    Canonical form of an utterance: NFC, trimmed, single-spaced. Both the
+    response cache key and the text the handlers below see.
+    """
+    return " ".join(unicodedata.normalize("NFC", utterance).split())
+
+def render_json(content) -> bytes:
+    # What SkillJSONResponse(content) sends
+    return dumps(content)
+
+# Only depends on HOST_BASE_URL: encoded once
+WELCOME_BODY = render_json(get_welcome_response())
+
 @app.post("/api/welcome")
 async def welcome(request: Request):
-    return get_welcome_response()
+    return Response(WELCOME_BODY, media_type="application/json")
 
-@app.post("/api/fallback")
-async def fallback(request: Request):
-    try:
-        body = await request.json()
-        user_request = body.get("userRequest", {})
-        utterance = user_request.get("utterance", "").strip()
-        
-        print(f"User Utterance: {utterance}")
+# --- Fallback Intents ---
+# The keyword checks of the fallback cascade live in intents.json (see
+# intent_table.py); responses that need code are the handlers below.
 
-        # 0. Handle Home/Start Keywords
-        if any(keyword == utterance for keyword in ["시작", "홈으로", "처음으로", "start", "home"]):
-             return get_welcome_response()
-
-        # 0-1. Handle Chatbot Usage
-        if "챗봇 사용법" in utterance or "사용법" in utterance:
-            return {
-                "version": "2.0",
-                "template": {
-                    "outputs": [
-                        simple_text(
-                            "💡 [이스트라 챗봇 사용법]\n\n"
-                            "1. 궁금한 단어를 입력해보세요.\n"
-                            "   예) '리모컨', '화면 설정', 'AS'\n\n"
-                            "2. 아래 메뉴 버튼을 눌러보세요.\n"
-                            "   자주 묻는 질문이나 자가 진단을\n"
-                            "   쉽게 확인할 수 있습니다.\n\n"
-                            "3. 해결이 안 되시면 '상담원 연결'을\n"
-                            "   눌러주세요."
-                        )
-                    ]
-                }
-            }
+def more_results_query(utterance: str):
+    """
+    (query, category) of a "더 보여줘" utterance; category is None when it
+    pages search results.
+    """
+    # Pattern: "{query} 더 보여줘" or "'{query}' 검색 결과 더 보여줘"
+    query = utterance.replace(" 검색 결과 더 보여줘", "").replace(" 더 보여줘", "").strip()
+    if len(query) > 2 and query[0] == query[-1] == "'":
+        # The search list card's title quotes the query
+        query = query[1:-1]
 
-        # 0-3. Handle TV Recommendation
-        if "나에게 맞는 TV" in utterance:
-             return {
-                "version": "2.0",
-                "template": {
-                    "outputs": [
-                        simple_text("📺 고객님에게 딱 맞는 TV를 찾아드릴게요!\n\n어떤 용도로 주로 사용하시나요?\n(아래 버튼을 선택하거나 키워드를 입력해주세요)")
-                    ],
-                    "quickReplies": [
-                        {"messageText": "넷플릭스용 TV 추천해줘", "action": "message", "label": "🎬 넷플릭스/유튜브"},
-                        {"messageText": "게임용 TV 추천해줘", "action": "message", "label": "🎮 게임 (PS5/Xbox)"},
-                        {"messageText": "방송 시청용 TV 추천해줘", "action": "message", "label": "📺 일반 방송 시청"}
-                    ]
-                }
-            }
+    # A category menu's title or key, else a search
+    return query, MENU_CATEGORIES.get(query)
 
-        # 0-3-1. Handle TV Recommendation Responses
-        
-        # Keywords
-        keywords_ott = ["넷플", "유튜브", "영화", "드라마", "ott", "영상", "디즈니", "티빙", "웨이브"]
-        keywords_game = ["게임", "플스", "xbox", "닌텐도", "스위치", "롤", "배그", "디아블로", "마비노기", "오버워치", "스팀", "ps5", "ps4"]
-        keywords_broadcast = ["방송", "효도", "뉴스", "아침", "부모님", "안방", "거실"]
-        keywords_any = ["상관", "아무거나", "모름", "그냥", "추천", "모르겠어", "걍"]
-
-        if any(k in utterance for k in keywords_ott):
-             return {
-                "version": "2.0",
-                "template": {
-                    "outputs": [
-                        basic_card({
-                            "title": "🎬 넷플릭스/유튜브 머신! 구글 TV",
-                            "description": "스마트 기능이 강화된 이스트라 구글 TV를 추천합니다.",
-                            "image_url": f"{HOST_BASE_URL}/images/menu_product_v2.png",
-                            "link": "https://estla.co.kr/194"
-                        })
-                    ],
-                    "quickReplies": [
-                        {"messageText": "챗봇 사용법", "action": "message", "label": "💡 챗봇 설명서"},
-                        {"messageText": "처음으로", "action": "message", "label": "🔄 처음으로"}
-                    ]
-                }
-            }
-        
-        if any(k in utterance for k in keywords_game):
-             return {
-                "version": "2.0",
-                "template": {
-                    "outputs": [
-                        basic_card({
-                            "title": "🎮 게이머를 위한 144Hz QLED",
-                            "description": "압도적인 주사율과 반응속도! 이스트라 쿠카 시리즈를 추천합니다.",
-                            "image_url": f"{HOST_BASE_URL}/images/menu_product_v2.png",
-                            "link": "https://estla.co.kr/194"
-                        })
-                    ],
-                    "quickReplies": [
-                        {"messageText": "챗봇 사용법", "action": "message", "label": "💡 챗봇 설명서"},
-                        {"messageText": "처음으로", "action": "message", "label": "🔄 처음으로"}
-                    ]
-                }
-            }
+def paging_params(utterance: str, offset: int, generation) -> Dict[str, str]:
+    """
+    Paging state for the page of utterance's results starting at offset:
+    enough for any worker with the same content, indexed in the same doc
+    id order (so ties rank alike), to serve it (see paging_offset). Kakao
+    context params are strings.
+    """
+    if generation.fingerprint:
+        token = hashlib.sha1(f"{generation.fingerprint}/{generation.layout}".encode("utf-8")).hexdigest()[:12]
+    else:
+        token = f"#{generation.number}"
+    return {
+        "query": hashlib.sha1(utterance.encode("utf-8")).hexdigest()[:12],
+        "offset": str(offset),
+        "generation": token,
+    }
 
-        if any(k in utterance for k in keywords_broadcast) or any(k in utterance for k in keywords_any):
-             return {
-                "version": "2.0",
-                "template": {
-                    "outputs": [
-                        basic_card({
-                            "title": "📺 가성비 최고! 일반형/All-Round TV",
-                            "description": "복잡한 기능 없이 방송 시청에 충실하거나, 모든 용도에 적합한 제품입니다.",
-                            "image_url": f"{HOST_BASE_URL}/images/menu_product_v2.png",
-                            "link": "https://estla.co.kr/194"
-                        })
-                    ],
-                    "quickReplies": [
-                        {"messageText": "챗봇 사용법", "action": "message", "label": "💡 챗봇 설명서"},
-                        {"messageText": "처음으로", "action": "message", "label": "🔄 처음으로"}
-                    ]
-                }
-            }
+def paging_offset(kakao_request: KakaoRequest, utterance: str, generation) -> Optional[int]:
+    """
+    Where the page asked for starts, from the paging state the previous
+    page sent along (clientExtra of a block button, else the context), or
+    None if there's none for this utterance and content.
+    """
+    params = (kakao_request.action.clientExtra or {}).get(PAGING_CONTEXT)
+    if params is None:
+        params = kakao_request.context_params(PAGING_CONTEXT)
+    if not isinstance(params, dict):
+        return None
+    expected = paging_params(utterance, 0, generation)
+    if params.get("query") != expected["query"] or params.get("generation") != expected["generation"]:
+        return None
+    offset = str(params.get("offset", ""))
+    return int(offset) if offset.isdigit() else None
+
+def results_page(utterance: str, generation, start: int, doc_ids: Optional[Sequence[int]] = None):
+    """
+    Results start+1 .. start+5 of a "더 보여줘" utterance, from doc_ids (a
+    cursor's ranking) if given, else searched again.
+    """
+    query, category = more_results_query(utterance)
+    if category is not None:
+        results = generation.categories[category]
+        page, total = results[start:start + 5], len(results)
+        title_prefix = CATEGORY_MENUS[category][0]
+    else:
+        if doc_ids is not None:
+            page = [generation.records[doc_id] for doc_id in doc_ids[start:start + 5]]
+            total = len(doc_ids)
+        else:
+            found = indexer.search_top_k(query, k=5, offset=start, generation=generation)
+            page, total = found.items, found.total
+        title_prefix = f"'{query}' 검색 결과"
+    return more_results_response(query, title_prefix, page, start, total, utterance,
+                                 paging_params(utterance, start + 5, generation))
 
-        # 0-3-2. Handle Unrecognized TV Recommendation Inputs (Contextual Fallback)
-        # If the user says "TV" or something similar but it wasn't caught by specific keywords above
-        # OR if they are in the middle of the flow (implied by context, though we are stateless)
-        # We check for "TV" specifically to provide a helpful prompt instead of falling through to search
-        if "tv" in utterance.lower() or "티비" in utterance:
-             return {
-                "version": "2.0",
-                "template": {
-                    "outputs": [
-                        simple_text("고객님에게 맞는 TV를 찾아드리기 위해 정확한 답변이 필요해요!\n키워드 (ex. 게임, 유튜브 등) 으로 입력해주세요!")
-                    ],
-                    "quickReplies": [
-                        {"messageText": "넷플릭스용 TV 추천해줘", "action": "message", "label": "🎬 넷플릭스/유튜브"},
-                        {"messageText": "게임용 TV 추천해줘", "action": "message", "label": "🎮 게임 (PS5/Xbox)"},
-                        {"messageText": "방송 시청용 TV 추천해줘", "action": "message", "label": "📺 일반 방송 시청"},
-                        {"messageText": "챗봇 사용법", "action": "message", "label": "💡 챗봇 설명서"},
-                        {"messageText": "처음으로", "action": "message", "label": "🔄 처음으로"}
-                    ]
-                }
-            }
+def more_results_request(utterance: str):
+    # Page 2, for requests with no paging state or cursor
+    return results_page(utterance, indexer.current, 5)
 
-        # 0-4. Handle Pagination (More Results)
-        # Pattern: "{query} 더 보여줘" or "{query} 검색 결과 더 보여줘"
-        if "더 보여줘" in utterance:
-            # Extract query
-            query = utterance.replace(" 검색 결과 더 보여줘", "").replace(" 더 보여줘", "").strip()
-            
-            # Determine source (Category or Search)
-            if query in ["자주 묻는 질문", "QnA"]:
-                results = indexer.get_by_category("QnA")
-                title_prefix = "자주 묻는 질문"
-            elif query in ["자가 진단", "Selftest"]:
-                results = indexer.get_by_category("Selftest")
-                title_prefix = "자가 진단"
-            else:
-                results = indexer.search(query)
-                title_prefix = f"'{query}' 검색 결과"
-            
-            # Get next 5 items (index 5 to 10)
-            next_items = results[5:10]
-            
-            if next_items:
-                return {
-                    "version": "2.0",
-                    "template": {
-                        "outputs": [
-                            simple_text(f"{title_prefix} 더 보기 (6~{5+len(next_items)}위)"),
-                            list_card(f"{query} 더 보기", next_items)
-                        ]
-                    }
-                }
-            else:
-                 return {
-                    "version": "2.0",
-                    "template": {
-                        "outputs": [
-                            simple_text("🚫 더 이상 보여줄 내용이 없습니다.")
-                        ]
-                    }
-                }
+class Cursor(NamedTuple):
+    utterance: str  # the "더 보여줘" message it pages
+    doc_ids: Optional[Sequence[int]]  # ranked search results; None for a category menu
+    offset: int  # where the next page starts
 
-        # 1. Handle Category Requests (Explicit Mappings)
-        # Prioritize specific "Selftest" keywords first to avoid "리스트" ambiguity
-        if any(keyword in utterance for keyword in ["자가 진단", "Selftest", "진단", "테스트"]):
-            items = indexer.get_by_category("Selftest")
-            return {
-                "version": "2.0",
-                "template": {
-                    "outputs": [
-                        simple_text("🛠️ 자가 진단 리스트입니다.\n원하시는 항목을 선택해주세요."),
-                        list_card("자가 진단", items)
-                    ]
-                }
-            }
+# Per user id, for the index generation they were ranked in
+result_cursors = ResponseCache(CURSOR_STORE_SIZE, CURSOR_TTL)
 
-        if any(keyword in utterance for keyword in ["QnA", "자주 묻는 질문", "질문", "전체 목록", "리스트"]):
-            items = indexer.get_by_category("QnA")
-            return {
-                "version": "2.0",
-                "template": {
-                    "outputs": [
-                        simple_text("❓ 자주 묻는 질문 리스트입니다.\n원하시는 항목을 선택해주세요."),
-                        list_card("자주 묻는 질문", items)
-                    ]
-                }
-            }
-            
-        if "상담원 연결 안내" in utterance:
-             return {
-                "version": "2.0",
-                "template": {
-                    "outputs": [
-                        simple_text("챗봇상담이 종료되었습니다. 상담원 연결 문의내용을 남겨주세요."),
-                        {
-                            "basicCard": {
-                                "title": "상담원 연결",
-                                "description": "평일 09:00 ~ 18:00 (점심시간 12:00 ~ 13:00)",
-                                "thumbnail": {
-                                    "imageUrl": f"{HOST_BASE_URL}/images/menu_customer_v2.png"
-                                },
-                                "buttons": [
-                                    {
-                                        "action": "message",
-                                        "label": "상담원 연결하기",
-                                        "messageText": "상담원 연결"
-                                    }
-                                ]
-                            }
-                        }
-                    ],
-                    "quickReplies": [
-                        {"messageText": "챗봇 사용법", "action": "message", "label": "💡 챗봇 설명서"},
-                        {"messageText": "처음으로", "action": "message", "label": "🔄 처음으로"}
-                    ]
-                }
-            }
-
-        # New Handlers for Homepage, Delivery, Company Intro
-        if "홈페이지" in utterance:
-            return {
-                "version": "2.0",
-                "template": {
-                    "outputs": [
-                        {
-                            "basicCard": {
-                                "title": "이스트라 홈페이지",
-                                "description": "이스트라의 다양한 제품을 만나보세요.",
-                                "thumbnail": {
-                                    "imageUrl": f"{HOST_BASE_URL}/images/menu_company_v2.png"
-                                },
-                                "buttons": [
-                                    {
-                                        "action": "webLink",
-                                        "label": "홈페이지 바로가기",
-                                        "webLinkUrl": "https://estla.co.kr/"
-                                    }
-                                ]
-                            }
-                        }
-                    ],
-                    "quickReplies": [
-                        {"messageText": "챗봇 사용법", "action": "message", "label": "💡 챗봇 설명서"},
-                        {"messageText": "처음으로", "action": "message", "label": "🔄 처음으로"}
-                    ]
-                }
-            }
+def more_results_page(utterance: str, user_id: str, generation):
+    """
+    The user's next page of a "더 보여줘": ranked once on the first ask,
+    then each page is a slice of their cursor. The cursor is dropped with
+    the last page, and by paged_body whenever the user asks for anything
+    else, so the next "더 보여줘" starts over at page 2.
+    """
+    query, category = more_results_query(utterance)
+    cursor = result_cursors.get(user_id, generation.number)
+    if cursor is None or cursor.utterance != utterance:
+        # Page 1 was the list card that sent this
+        doc_ids = None
+        if category is None:
+            doc_ids = array("i", indexer.search_top_k(query, k=None, generation=generation).doc_ids)
+        cursor = Cursor(utterance, doc_ids, 5)
+    total = len(cursor.doc_ids) if category is None else len(generation.categories[category])
+    if cursor.offset + 5 < total:
+        result_cursors.put(user_id, generation.number, cursor._replace(offset=cursor.offset + 5))
+    else:
+        result_cursors.discard(user_id)
+    return results_page(utterance, generation, cursor.offset, cursor.doc_ids)
+
+# What each handler's intents.json params may be; keep in step with
+# INTENT_HANDLERS
+HANDLER_PARAMS = {
+    "welcome": {},
+    "more_results": {},
+    "category_menu": {"category": CATEGORY_MENUS},
+}
+
+INTENT_HANDLERS = {
+    "welcome": lambda utterance: get_welcome_response(),
+    "more_results": more_results_request,
+    "category_menu": lambda utterance, category: category_menu_response(category),
+}
+
+# Handlers whose response doesn't depend on the utterance or the index
+FIXED_HANDLER_BODIES = {"welcome": WELCOME_BODY}
+
+# Replaced whole by reload_intents; a request reads it once
+intent_table = load_intents(INTENTS_PATH, HOST_BASE_URL, HANDLER_PARAMS, render_json)
+
+def reload_intents():
+    global intent_table
+    try:
+        table = load_intents(INTENTS_PATH, HOST_BASE_URL, HANDLER_PARAMS, render_json)
+    except (OSError, ValueError) as e:
+        print(f"Keeping the current intents, {INTENTS_PATH} is unusable: {e}")
+        return
+    intent_table = table
+    print(f"Loaded {len(table)} intents from {INTENTS_PATH}.")
+    title_responses.refresh()
+
+intent_watcher = ContentWatcher(INTENTS_PATH, reload_intents, debounce=CONTENT_WATCH_DEBOUNCE,
+                                poll_interval=CONTENT_WATCH_POLL_INTERVAL,
+                                fingerprint=lambda: file_identity(INTENTS_PATH))
+
+def intent_response(intent: Intent, utterance: str):
+    if intent.response is not None:
+        return intent.response
+    return INTENT_HANDLERS[intent.handler](utterance, **intent.params)
+
+def answering_intent(intents: List[Intent]) -> Optional[Intent]:
+    # The matched intent that answers before search, if any
+    for intent in intents:
+        if not intent.after_search:
+            return intent
+    return None
+
+def keyword_response(utterance: str, intents: Optional[List[Intent]] = None):
+    """
+    The response for a normalized utterance handled before search (fixed
+    keywords, menus, "더 보여줘" pages), or None. intents are
+    intent_table.matches(utterance) if already known.
+    """
+    if intents is None:
+        intents = intent_table.matches(utterance)
+    intent = answering_intent(intents)
+    if intent is None:
+        return None
+    return intent_response(intent, utterance)
+
+def fixed_body(intents: List[Intent]) -> Optional[bytes]:
+    """
+    The pre-encoded response if the keyword intent that answers (see
+    keyword_response) is a fixed one, else None.
+    """
+    intent = answering_intent(intents)
+    if intent is None:
+        return None
+    if intent.body is not None:
+        return intent.body
+    return FIXED_HANDLER_BODIES.get(intent.handler)
+
+def paged_body(utterance: str, kakao_request: KakaoRequest, generation, table: IntentTable,
+               intents: List[Intent]) -> Optional[bytes]:
+    """
+    The page a "더 보여줘" asks for when the request says which one: its
+    paging state, else the user's cursor. None for anything else,
+    including a first "더 보여줘" from an unknown user (page 2, the more
+    intent's handler). intents are table.matches(utterance).
+    """
+    user = kakao_request.userRequest.user
+    intent = answering_intent(intents)
+    if intent is None or intent.handler != "more_results":
+        if user is not None:
+            # A new search or menu: its "더 보기" pages from the start
+            result_cursors.discard(user.id)
+        return None
+    start = paging_offset(kakao_request, utterance, generation)
+    if start is not None:
+        # Stateless: the same for every user, so it's cached like page 2
+        key = (utterance, start)
+        version = (generation.number, table.version)
+        body = response_cache.get(key, version)
+        if body is None:
+            body = response_cache.put(key, version, render_json(results_page(utterance, generation, start)))
+        return body
+    if user is not None:
+        # Depends on the user's cursor: never cached
+        return render_json(more_results_page(utterance, user.id, generation))
+    return None
+
+def single_result_response(item: Dict):
+    # A conversational summary for a search with one match
+    return {
+        "version": "2.0",
+        "template": {
+            "outputs": [
+                simple_text(f"'{item['title']}'에 대해 찾아보았습니다.\n\n{item['summary']}\n\n자세한 내용은 아래 '자세히 보기' 버튼을 눌러 확인해주세요."),
+                basic_card(item)
+            ]
+        }
+    }
 
-        if "배송조회" in utterance or "배송 조회" in utterance or utterance == "배송":
-             return {
-                "version": "2.0",
-                "template": {
-                    "outputs": [
-                        {
-                            "basicCard": {
-                                "title": "배송 조회",
-                                "description": "주문하신 상품의 배송 현황을 확인하세요.",
-                                "thumbnail": {
-                                    "imageUrl": f"{HOST_BASE_URL}/images/menu_company_v2.png"
-                                },
-                                "buttons": [
-                                    {
-                                        "action": "webLink",
-                                        "label": "배송 조회하기",
-                                        "webLinkUrl": "https://estla.co.kr/211"
-                                    }
-                                ]
-                            }
-                        }
-                    ],
-                    "quickReplies": [
-                        {"messageText": "챗봇 사용법", "action": "message", "label": "💡 챗봇 설명서"},
-                        {"messageText": "처음으로", "action": "message", "label": "🔄 처음으로"}
-                    ]
-                }
-            }
+class TitleMap(NamedTuple):
+    generation: Optional[IndexGeneration]
+    table: Optional[IntentTable]
+    doc_ids: Dict[str, int]  # normalized title -> doc id
+    rendered: Dict[int, bytes]  # doc id -> response, filled in as titles are tapped
 
-        if "회사" in utterance or "소개" in utterance:
-             return {
-                "version": "2.0",
-                "template": {
-                    "outputs": [
-                        simple_text("이스트라는 TV 전문 브랜드로서, '기본에 충실하자'라는 슬로건 아래 합리적인 가격과 최고의 품질, 그리고 진정성 있는 서비스를 제공합니다.\n\n2019년 설립 이후 스마트 TV 시장을 선도하며, 국내 최초 전 부품 5년 무상 A/S를 실시하는 등 고객 만족을 위해 최선을 다하고 있습니다."),
-                        {
-                            "basicCard": {
-                                "title": "이스트라 브랜드 스토리",
-                                "description": "이스트라의 이야기를 더 자세히 알아보세요.",
-                                "thumbnail": {
-                                    "imageUrl": f"{HOST_BASE_URL}/images/menu_company_v2.png"
-                                },
-                                "buttons": [
-                                    {
-                                        "action": "webLink",
-                                        "label": "브랜드 스토리 보기",
-                                        "webLinkUrl": "https://estla.co.kr/brandstory"
-                                    }
-                                ]
-                            }
-                        }
-                    ],
-                    "quickReplies": [
-                        {"messageText": "챗봇 사용법", "action": "message", "label": "💡 챗봇 설명서"},
-                        {"messageText": "처음으로", "action": "message", "label": "🔄 처음으로"}
-                    ]
-                }
-            }
-            
+class TitleResponses:
+    """
+    Serialized fallback responses for utterances that are exactly a
+    document title, which is what tapping a list card item sends. Per index
+    generation and intent table: a map from each post's normalized title
+    to its own doc id (where search's exact stage finds that post), and
+    each document's single-result
+    response, rendered on its first tap. Titles a keyword intent answers
+    are left out, so the response is the one the full cascade gives.
+
+    The map is built by refresh() whenever either is replaced (on the
+    thread that replaced it), never in the request path: until it has
+    caught up, get() returns None and the request is answered the usual
+    way.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.map = TitleMap(None, None, {}, {})
+        self.hits = 0
+
+    def refresh(self):
+        # Serialized, and reads both when it starts, so the last call
+        # builds for the newest pair
+        with self.lock:
+            generation, table = indexer.current, intent_table
+            if generation is self.map.generation and table is self.map.table:
+                return
+            engine = generation.engine
+            doc_ids = {}
+            for doc_id, record in enumerate(generation.records):
+                if record is None:
+                    continue
+                key = normalize_utterance(record.title)
+                if key in doc_ids:
+                    continue
+                # Only where search's exact stage finds this very post
+                if (engine.exact_match(key.lower().strip()) == doc_id
+                        and answering_intent(table.matches(key)) is None):
+                    doc_ids[key] = doc_id
+            self.map = TitleMap(generation, table, doc_ids, {})
+
+    def get(self, utterance: str, generation, table: IntentTable) -> Optional[bytes]:
+        title_map = self.map
+        if title_map.generation is not generation or title_map.table is not table:
+            return None
+        doc_id = title_map.doc_ids.get(utterance)
+        if doc_id is None:
+            return None
+        body = title_map.rendered.get(doc_id)
+        if body is None:
+            body = title_map.rendered[doc_id] = render_json(single_result_response(generation.records[doc_id]))
+        self.hits += 1
+        return body
+
+    def stats(self) -> Dict[str, object]:
+        title_map = self.map
+        return {
+            "titles": len(title_map.doc_ids),
+            "rendered": len(title_map.rendered),
+            "hits": self.hits,
+            "generation": (title_map.generation.number, title_map.table.version) if title_map.table else None,
+        }
 
+title_responses = TitleResponses()
+indexer.on_publish = lambda generation: title_responses.refresh()
+title_responses.refresh()
 
-        # 2. Handle Search
-        results = indexer.search(utterance)
-        
-        if results:
-            # If single match, provide a more conversational summary
-            if len(results) == 1:
-                item = results[0]
-                return {
-                    "version": "2.0",
-                    "template": {
-                        "outputs": [
-                            simple_text(f"'{item['title']}'에 대해 찾아보았습니다.\n\n{item['summary']}\n\n자세한 내용은 아래 '자세히 보기' 버튼을 눌러 확인해주세요."),
-                            basic_card(item)
-                        ]
-                    }
-                }
-            
-            # Multiple matches -> Show ListCard
-            return {
-                "version": "2.0",
-                "template": {
-                    "outputs": [
-                        simple_text(f"'{utterance}'와 관련된 문서를 {len(results)}개 찾았습니다.\n원하시는 내용을 선택해주세요."),
-                        list_card(f"'{utterance}' 검색 결과", results)
-                    ]
-                }
-            }
+def fallback_response(utterance: str, table: Optional[IntentTable] = None, intents: Optional[List[Intent]] = None):
+    """
+    The skill response for a normalized utterance. intents are
+    table.matches(utterance) if already known.
+    """
+    if intents is None:
+        intents = (table or intent_table).matches(utterance)
+    response = keyword_response(utterance, intents)
+    if response is not None:
+        return response
+
+    # 2. Handle Search (only the first card's worth is ordered; total is counted)
+    results = indexer.search_top_k(utterance, k=5)
+    
+    if results.total:
+        # If single match, provide a more conversational summary
+        if results.total == 1:
+            return single_result_response(results.items[0])
         
-        # 3. Handle Product Keywords (Fallback if search fails)
-        if any(keyword in utterance for keyword in ["상품", "제품", "모델"]):
-            items = indexer.get_by_category("Products")
-            return {
-                "version": "2.0",
-                "template": {
-                    "outputs": [
-                        simple_text("이스트라의 주요 제품 리스트입니다.\n원하시는 항목을 선택해주세요."),
-                        list_card("이스트라 제품", items)
-                    ]
-                }
-            }
-
-        # 4. No Results - True Fallback
+        # Multiple matches -> Show ListCard
         return {
             "version": "2.0",
             "template": {
                 "outputs": [
-                    simple_text(f"'{utterance}'에 대한 내용을 찾지 못했습니다.\n다른 키워드로 검색해보시거나 메뉴를 선택해주세요.")
-                ],
-
-                "quickReplies": [
-                    {
-                        "messageText": "홈으로",
-                        "action": "message",
-                        "label": "🏠 홈으로"
-                    },
-                    {
-                        "messageText": "QnA 리스트 보여줘",
-                        "action": "message",
-                        "label": "전체 목록 보기"
-                    },
-                    {
-                        "messageText": "챗봇 사용법",
-                        "action": "message",
-                        "label": "💡 챗봇 설명서"
-                    },
-                    {
-                        "messageText": "처음으로",
-                        "action": "message",
-                        "label": "🔄 처음으로"
-                    }
+                    simple_text(f"'{utterance}'와 관련된 문서를 {results.total}개 찾았습니다.\n원하시는 내용을 선택해주세요."),
+                    list_card(f"'{utterance}' 검색 결과", results.items, results.total)
                 ]
             }
         }
+    
+    # 3. Handle Product Keywords (Fallback if search fails)
+    for intent in intents:
+        if intent.after_search:
+            return intent_response(intent, utterance)
+
+    # 4. No Results - True Fallback
+    return {
+        "version": "2.0",
+        "template": {
+            "outputs": [
+                simple_text(f"'{utterance}'에 대한 내용을 찾지 못했습니다.\n다른 키워드로 검색해보시거나 메뉴를 선택해주세요.")
+            ],
+
+            "quickReplies": [
+                {
+                    "messageText": "홈으로",
+                    "action": "message",
+                    "label": "🏠 홈으로"
+                },
+                {
+                    "messageText": "QnA 리스트 보여줘",
+                    "action": "message",
+                    "label": "전체 목록 보기"
+                },
+                {
+                    "messageText": "챗봇 사용법",
+                    "action": "message",
+                    "label": "💡 챗봇 설명서"
+                },
+                {
+                    "messageText": "처음으로",
+                    "action": "message",
+                    "label": "🔄 처음으로"
+                }
+            ]
+        }
+    }
+
+ERROR_RESPONSE = {
+    "version": "2.0",
+    "template": {
+        "outputs": [simple_text("오류가 발생했습니다.")]
+    }
+}
+
+@app.post("/api/fallback")
+async def fallback(request: Request):
+    try:
+        body = await read_body(request, MAX_REQUEST_BYTES)
+        if body is None:
+            return SkillJSONResponse({"error": "Request body too large"}, status_code=413)
+        kakao_request = KakaoRequest.decode(body)
+        utterance = normalize_utterance(kakao_request.userRequest.utterance)
+
+        print(f"User Utterance: {utterance}")
+
+        # Every response below depends only on the utterance, the index and
+        # the intents, except "더 보여줘" pages that carry paging state or
+        # follow a user's cursor
+        generation = indexer.current
+        table = intent_table
+        version = (generation.number, table.version)
+        # A tapped list card item sends its title: answered from a dict
+        content = title_responses.get(utterance, generation, table)
+        if content is not None:
+            return Response(content, media_type="application/json")
+        # Matched once; everything below routes on these
+        intents = table.matches(utterance)
+        content = paged_body(utterance, kakao_request, generation, table, intents)
+        if content is None:
+            content = response_cache.get(utterance, version)
+        if content is None:
+            # Fixed menus and notices are encoded with the intent table;
+            # they'd only take cache slots from search results
+            content = fixed_body(intents)
+        if content is None:
+            content = response_cache.put(utterance, version,
+                                         render_json(fallback_response(utterance, table, intents)))
+        return Response(content, media_type="application/json")
+
+    except ValidationError as e:
+        print(f"Invalid skill request: {e.error_count()} error(s), first: {e.errors()[0]['msg']}")
+        return SkillJSONResponse(ERROR_RESPONSE, status_code=400)
 
     except Exception as e:
         import traceback
         with open("error.log", "w", encoding="utf-8") as f:
             f.write(f"Error: {e}\n")
             traceback.print_exc(file=f)
-        return {
-            "version": "2.0",
-            "template": {
-                "outputs": [simple_text("오류가 발생했습니다.")]
-            }
-        }
+        return SkillJSONResponse(ERROR_RESPONSE)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {**response_cache.stats(), "exact_titles": title_responses.stats(),
+            "cursors": result_cursors.stats()}
+
+@app.get("/debug/search")
+async def debug_search(q: str, k: int = 5, offset: int = 0, token: Optional[str] = None):
+    """
+    Runs a search in explain mode: per-stage candidates examined, hits and
+    time in microseconds, and why each result ranked where it did.
+    """
+    # Off unless a token is configured: explain mode reruns every stage
+    if not DEBUG_TOKEN:
+        return JSONResponse({"error": "Not Found"}, status_code=404)
+    if token is None or not secrets.compare_digest(token, DEBUG_TOKEN):
+        return JSONResponse({"error": "Forbidden"}, status_code=403)
+    k = min(max(k, 1), DEBUG_MAX_K)
+    return indexer.search_top_k(q, k=k, offset=max(offset, 0), explain=True).explain
 
 # --- Keep-Alive Mechanism ---
 @app.on_event("startup")
 async def startup_event():
     asyncio.create_task(keep_alive())
+    if CONTENT_WATCH and os.path.exists(BASE_DIR):
+        content_watcher.start()
+    if CONTENT_WATCH:
+        intent_watcher.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    content_watcher.stop()
+    intent_watcher.stop()
 
 async def keep_alive():
     while True:
@@ -877,5 +1225,37 @@ async def serve_static(file_path: str):
             return {"error": str(e)}
 
 if __name__ == "__main__":
-    print(f"Serving static files from {BASE_DIR} at /static (Custom Handler)")
-    uvicorn.run(app, host="0.0.0.0", port=8081)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--build-snapshot", action="store_true",
+                        help=f"write the content index to {SNAPSHOT_PATH} and exit")
+    parser.add_argument("--build-mapped-index", action="store_true",
+                        help="write the shared index for multi-worker servers to INDEX_MAPPED_PATH and exit")
+    parser.add_argument("--watch", action="store_true",
+                        help="with --build-mapped-index: keep running and rewrite it whenever posts change")
+    args = parser.parse_args()
+    if args.build_mapped_index and not MAPPED_INDEX_PATH:
+        parser.error("--build-mapped-index needs INDEX_MAPPED_PATH to be set")
+
+    if args.build_snapshot or args.build_mapped_index:
+        # The module-level indexer has already loaded or rebuilt the index,
+        # but a mapped one can't be written out again
+        if indexer.mapped_path is not None:
+            indexer.load_private()
+    if args.build_snapshot:
+        indexer.save_snapshot(SNAPSHOT_PATH)
+    if args.build_mapped_index:
+        indexer.save_mapped(MAPPED_INDEX_PATH)
+        if args.watch:
+            def update_mapped():
+                if any(indexer.update_index()):
+                    indexer.save_mapped(MAPPED_INDEX_PATH)
+            watcher = ContentWatcher(BASE_DIR, update_mapped, debounce=CONTENT_WATCH_DEBOUNCE,
+                                     poll_interval=CONTENT_WATCH_POLL_INTERVAL)
+            watcher.start()
+            try:
+                threading.Event().wait()
+            except KeyboardInterrupt:
+                watcher.stop()
+    if not (args.build_snapshot or args.build_mapped_index):
+        print(f"Serving static files from {BASE_DIR} at /static (Custom Handler)")
+        uvicorn.run(app, host="0.0.0.0", port=8081)
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import re
+from typing import Dict, List
+
+from hangul import PARTICLES, is_syllable
+
+# --- Synonyms ---
+# Alias spellings ("리모콘", "a/s", "티비") are rewritten to one canonical
+# form before indexing and before searching, so every spelling of a term
+# shares the same postings and the ordinary search stages find it.
+
+# Bump when the matching rules change: the digest, and so snapshots built
+# with the old rules, change with it
+MATCH_RULES = 2
+
+# How a 하다/되다 verb made from a noun goes on ("리셋하기", "업뎃됐어요")
+VERB_ENDINGS = ("하", "해", "했", "한", "할", "합", "되", "돼", "됐", "된", "될", "됩")
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+def _joined(a: str, b: str) -> bool:
+    # Neighbouring characters of the same word: both Latin/digits or both Hangul
+    return (_is_word_char(a) and _is_word_char(b)) or (is_syllable(a) and is_syllable(b))
+
+
+class SynonymTable:
+    """
+    Compiled alias -> canonical map. canonical() rewrites lowercased text
+    in one regex pass; the canonical forms themselves are part of the
+    pattern so a longer word isn't rewritten from inside ("넷플" must not
+    touch "넷플릭스").
+    """
+
+    def __init__(self, groups: Dict[str, List[str]]):
+        self.canonical_of: Dict[str, str] = {}
+        for canonical, aliases in groups.items():
+            canonical = canonical.lower()
+            for alias in [canonical, *aliases]:
+                self.canonical_of[alias.lower()] = canonical
+        entries = sorted(self.canonical_of.items())
+        # Identifies the table a snapshot was built with
+        self.digest = hashlib.sha1(json.dumps([MATCH_RULES, entries], ensure_ascii=False).encode("utf-8")).hexdigest()
+        # Plain substring checks are much cheaper than the regex scan, and
+        # most bodies contain no alias at all
+        self.aliases = [alias for alias, canonical in entries if alias != canonical]
+        alternatives = sorted(self.canonical_of, key=len, reverse=True)
+        # Plain literals only: lets the regex engine skip ahead to possible
+        # first characters. Word boundaries are checked in _replace instead
+        self.pattern = re.compile("|".join(map(re.escape, alternatives))) if alternatives else None
+
+    def canonical(self, text: str) -> str:
+        """
+        text (lowercased) with every alias replaced by its canonical form.
+        """
+        if self.pattern is None or not any(alias in text for alias in self.aliases):
+            return text
+        return self.pattern.sub(self._replace, text)
+
+    def _replace(self, match: "re.Match") -> str:
+        alias = match.group()
+        # Aliases only match whole words ("as" not inside "glass", "리셋" not
+        # inside "프리셋"); a Hangul word may go on with a particle or a
+        # 하다/되다 ending ("리모콘으로", "리셋하기") but nothing else ("블투스")
+        text, start, end = match.string, match.start(), match.end()
+        if start > 0 and _joined(text[start - 1], alias[0]):
+            return alias
+        if end < len(text) and _joined(alias[-1], text[end]):
+            if not is_syllable(text[end]):
+                return alias
+            word_end = end
+            while word_end < len(text) and is_syllable(text[word_end]):
+                word_end += 1
+            if text[end:word_end] not in PARTICLES and not text.startswith(VERB_ENDINGS, end):
+                return alias
+        return self.canonical_of[alias]
+
+    def __len__(self):
+        return len(self.canonical_of)
+
+
+def load_synonyms(path: str) -> SynonymTable:
+    """
+    Reads {"canonical": ["alias", ...]} from a JSON file. A missing or
+    unreadable file gives an empty table.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            return SynonymTable(json.load(f))
+    except FileNotFoundError:
+        return SynonymTable({})
+    except Exception as e:
+        print(f"Error loading synonyms {path}: {e}")
+        return SynonymTable({})